@@ -35,7 +35,7 @@ setup(
     python_requires=">=3.6",
     install_requires=["waymo-open-dataset-tf-2-1-0", "opencv-python",],
     extras_require={
-        "all": ["shapely", "psutil"],
+        "all": ["shapely", "psutil", "crc32c", "lz4"],
         "dev": ["flake8", "isort", "black==19.10b0", "flake8-bugbear", "flake8-comprehensions"],
     },
 )
@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from collections import OrderedDict
+from typing import Callable, Dict
+
+import numpy as np
+
+from waymo_toolkit.utils.logger import create_small_table, setup_logger
+from waymo_toolkit.utils.synthetic import make_segment
+from waymo_toolkit.utils.tfrecord import TFRecordReader
+
+logger = setup_logger("extractor")
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark.json")
+
+
+def _best(func: Callable[[], None], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_extractors(segment: str, work_dir: str, args) -> Dict[str, float]:
+    from waymo_toolkit.extractor import ImageExtractor, LabelExtractor, LaserExtractor
+
+    extractors = OrderedDict(
+        [
+            ("image", lambda dataset, save_dir: ImageExtractor(dataset, save_dir)),
+            ("label", lambda dataset, save_dir: LabelExtractor(dataset, save_dir)),
+            (
+                "laser",
+                lambda dataset, save_dir: LaserExtractor(
+                    dataset, save_dir, engine=args.laser_engine
+                ),
+            ),
+        ]
+    )
+    seconds = OrderedDict()
+    for name, build in extractors.items():
+        save_dir = os.path.join(work_dir, "extracted")
+
+        def run():
+            shutil.rmtree(save_dir, ignore_errors=True)
+            with TFRecordReader(segment) as dataset:
+                build(dataset, save_dir).extract()
+
+        seconds[name] = _best(run, args.repeat)
+    return seconds
+
+
+def extract_labels(segment: str, save_dir: str) -> None:
+    from waymo_toolkit.extractor import LabelExtractor
+
+    with TFRecordReader(segment) as dataset:
+        LabelExtractor(dataset, save_dir).extract()
+
+
+def bench_ransac(save_dir: str, args) -> float:
+    from waymo_toolkit.utils.laser_io import list_laser_frames, load_laser
+    from waymo_toolkit.utils.ransac import ransac
+
+    lasers = [
+        np.ascontiguousarray(load_laser(save_dir, name)["xyz"], dtype=np.float32)
+        for name in sorted(list_laser_frames(save_dir))
+    ]
+
+    def run():
+        for laser in lasers:
+            ransac(laser, int(0.2 * len(laser)), 100, 0.1, False, args.seed)
+
+    return _best(run, args.repeat)
+
+
+def bench_projection(save_dir: str, args) -> float:
+    from waymo_toolkit.utils.label_io import get_calibration, get_vehicle_to_image, load_annotation
+    from waymo_toolkit.utils.laser_io import list_laser_frames, load_laser
+    from waymo_toolkit.viewer.viewer_2d import Viewer2D
+
+    viewer = Viewer2D(
+        argparse.Namespace(source=save_dir, split="", box2d=True, box3d=True, project=True)
+    )
+    frames = []
+    for name in sorted(list_laser_frames(save_dir)):
+        laser = load_laser(save_dir, name, ["xyz", "range"])
+        anno = load_annotation(save_dir, name)
+        calibration = get_calibration(save_dir, anno).camera_calibrations[0]
+        img = np.zeros((calibration.height, calibration.width, 3), dtype=np.uint8)
+        vehicle_to_image = get_vehicle_to_image(save_dir, anno, 0)
+        frames.append((img, laser["xyz"], laser["range"], vehicle_to_image, anno))
+
+    def run():
+        # the drawing paths of Viewer2D.display, without the window
+        for img, pcl, pcl_r, vehicle_to_image, anno in frames:
+            viewer._project_laser_on_image(img, pcl, pcl_r, vehicle_to_image)
+            for label in anno.camera_labels[0].labels:
+                viewer._draw_2d_box(img, label)
+            for label in anno.laser_labels:
+                viewer._draw_3d_box(img, vehicle_to_image, label)
+
+    return _best(run, args.repeat)
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float):
+    """Return the cases slower than the baseline by more than the tolerance.
+    """
+    regressions = []
+    for name, fps in results.items():
+        if name in baseline and fps < baseline[name] * (1 - tolerance):
+            regressions.append(
+                "{} runs at {:.2f} frames/s, the baseline is {:.2f}".format(
+                    name, fps, baseline[name]
+                )
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarking the toolkit on synthetic data")
+    parser.add_argument(
+        "--work-dir", default="/tmp/waymo_toolkit_benchmark", help="the scratch dir", type=str
+    )
+    parser.add_argument("--frames", default=20, help="the number of frames", type=int)
+    parser.add_argument("--repeat", default=3, help="the number of runs, keep the best", type=int)
+    parser.add_argument("--seed", default=20200319, help="random seed for the data", type=int)
+    parser.add_argument(
+        "--laser-engine",
+        default="numpy",
+        help="engine converting the range images, in ['tf', 'numpy']",
+        type=str,
+    )
+    parser.add_argument(
+        "--baseline", default=DEFAULT_BASELINE, help="the json of the baseline", type=str
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="save the results as the baseline"
+    )
+    parser.add_argument(
+        "--tolerance", default=0.2, help="the slowdown accepted over the baseline", type=float
+    )
+    args = parser.parse_args()
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    segment = os.path.join(args.work_dir, "segment-{}-{}.tfrecord".format(args.seed, args.frames))
+    if not os.path.isfile(segment):
+        logger.info("Generating {}".format(segment))
+        make_segment(segment, "benchmark", args.frames, args.seed)
+
+    seconds = bench_extractors(segment, args.work_dir, args)
+    # every run starts from scratch, so only the lasers are left, add the labels for the viewer
+    save_dir = os.path.join(args.work_dir, "extracted")
+    extract_labels(segment, save_dir)
+    seconds["ransac"] = bench_ransac(save_dir, args)
+    seconds["projection"] = bench_projection(save_dir, args)
+
+    results = OrderedDict((name, args.frames / _) for name, _ in seconds.items())
+    logger.info("Frames/s over {} frames:\n".format(args.frames) + create_small_table(results))
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as fout:
+            json.dump(results, fout, indent=2)
+        logger.info("Saved the baseline to {}".format(args.baseline))
+    elif os.path.isfile(args.baseline):
+        with open(args.baseline, "r") as fin:
+            baseline = json.load(fin)
+        ratios = OrderedDict((k, v / baseline[k]) for k, v in results.items() if k in baseline)
+        logger.info("Speed over the baseline:\n" + create_small_table(ratios))
+        regressions = compare(results, baseline, args.tolerance)
+        assert len(regressions) == 0, "\n".join(regressions)
+    else:
+        logger.info("No baseline in {}, save one with --save-baseline".format(args.baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from waymo_toolkit.utils.logger import create_small_table, setup_logger
+
+logger = setup_logger("extractor")
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+# none of these should be loaded before they are used
+HEAVY_MODULES = ["tensorflow", "waymo_open_dataset", "mayavi", "numba"]
+MODULES = ["waymo_toolkit.extractor", "waymo_toolkit.viewer"]
+# every CLI in tools/
+TOOLS = sorted(_ for _ in os.listdir(TOOLS_DIR) if _.endswith(".py"))
+
+
+def _run(args, repeat: int) -> float:
+    """Return the best wall time of running python with args."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.time()
+        subprocess.run([sys.executable] + args, check=True, stdout=subprocess.DEVNULL)
+        best = min(best, time.time() - start)
+    return best
+
+
+def heavy_modules(module: str):
+    code = "import sys, {}; print(','.join(m for m in {} if m in sys.modules))".format(
+        module, HEAVY_MODULES
+    )
+    out = subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.PIPE)
+    return [_ for _ in out.stdout.decode("utf-8").strip().split(",") if _]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the startup time of the modules and tools")
+    parser.add_argument("--budget", default=1.0, help="the max seconds of a startup", type=float)
+    parser.add_argument("--repeat", default=3, help="the number of runs, keep the best", type=int)
+    parser.add_argument("--run", action="store_true", help="run the benchmark")
+    args = parser.parse_args()
+    if not args.run:
+        # --help and no flag stop here, so the script can time its own startup
+        return
+
+    baseline = _run(["-c", "pass"], args.repeat)
+    results = {}
+    failures = []
+    for module in MODULES:
+        elapsed = _run(["-c", "import {}".format(module)], args.repeat) - baseline
+        results["import " + module] = elapsed
+        loaded = heavy_modules(module)
+        if loaded:
+            failures.append("import {} loads {}".format(module, ", ".join(loaded)))
+    for tool in TOOLS:
+        elapsed = _run([os.path.join(TOOLS_DIR, tool), "--help"], args.repeat) - baseline
+        results[tool + " --help"] = elapsed
+
+    logger.info(
+        "Startup time (s) over the interpreter ({:.3f}s):\n".format(baseline)
+        + create_small_table({k: round(v, 3) for k, v in results.items()})
+    )
+    for name, elapsed in results.items():
+        if elapsed > args.budget:
+            failures.append(
+                "{} takes {:.3f}s over the budget {:.3f}s".format(name, elapsed, args.budget)
+            )
+    assert len(failures) == 0, "\n".join(failures)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable, Dict
+
+from waymo_toolkit.utils.logger import create_small_table, setup_logger
+
+logger = setup_logger("extractor")
+
+# the implementations of protobuf, see waymo_toolkit.utils.proto_utils.BACKENDS, which is
+# not imported here, importing protobuf would choose the implementation of this process
+BACKENDS = ["upb", "cpp", "python"]
+
+
+def _best(func: Callable[[], None], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_parse(segment: str, repeat: int) -> Dict[str, float]:
+    """Return the ms to parse a frame, with a new message and a copy of every record as
+    before, and with one reused message parsing the views of the records.
+    """
+    from waymo_toolkit.protos import annotation_pb2 as annotation
+    from waymo_toolkit.protos import dataset_pb2 as open_dataset
+    from waymo_toolkit.utils.proto_utils import parse_into
+    from waymo_toolkit.utils.tfrecord import TFRecordReader
+
+    reader = TFRecordReader(segment)
+    records = [reader[k] for k in range(len(reader))]
+
+    def copied(message_type):
+        def run():
+            for data in records:
+                message = message_type()
+                message.ParseFromString(bytearray(data))
+
+        return run
+
+    def reused(message_type):
+        message = message_type()
+
+        def run():
+            for data in records:
+                parse_into(message, data)
+
+        return run
+
+    cases = OrderedDict(
+        [
+            ("frame copied", copied(open_dataset.Frame)),
+            ("frame reused", reused(open_dataset.Frame)),
+            ("label copied", copied(annotation.Annotation)),
+            ("label reused", reused(annotation.Annotation)),
+        ]
+    )
+    results = OrderedDict((k, _best(v, repeat) * 1000 / len(records)) for k, v in cases.items())
+    # the views of the records must be released before the reader is closed
+    records.clear()
+    reader.close()
+    return results
+
+
+def run_backend(backend: str, segment: str, repeat: int) -> Dict[str, float]:
+    """Run bench_parse in a new python with the backend, return {} if it is not available.
+    """
+    env = dict(os.environ, PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION=backend)
+    command = [sys.executable, os.path.abspath(__file__), "--worker", "--segment", segment]
+    command += ["--repeat", str(repeat)]
+    out = subprocess.run(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if out.returncode != 0:
+        lines = out.stderr.decode("utf-8").strip().split("\n")
+        errors = [_ for _ in lines if "Error" in _]
+        error = errors[-1] if errors else lines[-1]
+        logger.warning("{} is not available: {}".format(backend, error))
+        return {}
+    results = json.loads(out.stdout.decode("utf-8").strip().split("\n")[-1])
+    # protobuf falls back to another implementation if the one asked for is missing
+    if results.pop("backend") != backend:
+        logger.warning("{} is not available".format(backend))
+        return {}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarking the parsing of each protobuf")
+    parser.add_argument(
+        "--work-dir", default="/tmp/waymo_toolkit_benchmark", help="the scratch dir", type=str
+    )
+    parser.add_argument("--segment", default="", help="a tfrecord, or a synthetic one", type=str)
+    parser.add_argument("--frames", default=20, help="the number of frames", type=int)
+    parser.add_argument("--repeat", default=3, help="the number of runs, keep the best", type=int)
+    parser.add_argument("--seed", default=20200319, help="random seed for the data", type=int)
+    parser.add_argument(
+        "--backends", default=",".join(BACKENDS), help="the backends to compare", type=str
+    )
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        from waymo_toolkit.utils.proto_utils import protobuf_backend
+
+        results = bench_parse(args.segment, args.repeat)
+        results["backend"] = protobuf_backend()
+        print(json.dumps(results))
+        return
+
+    segment = args.segment
+    if not segment:
+        from waymo_toolkit.utils.synthetic import make_segment
+
+        os.makedirs(args.work_dir, exist_ok=True)
+        segment = os.path.join(
+            args.work_dir, "segment-{}-{}.tfrecord".format(args.seed, args.frames)
+        )
+        if not os.path.isfile(segment):
+            logger.info("Generating {}".format(segment))
+            make_segment(segment, "benchmark", args.frames, args.seed)
+
+    table = OrderedDict()
+    for backend in [_.strip() for _ in args.backends.split(",")]:
+        results = run_backend(backend, segment, args.repeat)
+        for case, ms in results.items():
+            table.setdefault(case, OrderedDict())[backend] = round(ms, 3)
+    for case, row in table.items():
+        logger.info("ms per frame to parse, {}:\n".format(case) + create_small_table(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import os
+from collections import Counter
+from typing import List, Optional
+
+from waymo_toolkit.utils.catalog import OBJECT_TYPES, Catalog, parse_object_counts
+from waymo_toolkit.utils.logger import create_small_table, setup_logger
+from waymo_toolkit.utils.split import save_split, select_subset
+
+logger = setup_logger("extractor")
+
+FOLDS = {
+    "train": ["training_seg"],
+    "val": ["validation_seg"],
+    "test": ["testing_seg"],
+    "all": ["training_seg", "validation_seg", "testing_seg"],
+}
+
+
+def _values(values: str) -> Optional[List[str]]:
+    return [_.strip() for _ in values.split(",")] if values else None
+
+
+def load_catalog(source_dir: str, save_dir: str, overwrite: bool) -> Catalog:
+    path = os.path.join(save_dir, "catalog.npz")
+    if os.path.isfile(path) and not overwrite:
+        return Catalog.load(path)
+    files = sorted(
+        [os.path.join(source_dir, _) for _ in os.listdir(source_dir) if _.endswith("tfrecord")]
+    )
+    catalog = Catalog.build(files)
+    os.makedirs(save_dir, exist_ok=True)
+    catalog.save(path)
+    logger.info("{} segments of {} catalogued in {}".format(len(catalog), source_dir, path))
+    return catalog
+
+
+def describe(catalog: Catalog) -> None:
+    for column in ["time_of_day", "location", "weather"]:
+        counts = Counter(_.decode("utf-8") for _ in catalog.segments[column])
+        logger.info("Segments by {}:\n".format(column) + create_small_table(counts))
+    objects = {_: int(catalog.frames[_].sum()) for _ in OBJECT_TYPES}
+    logger.info("Objects in {} frames:\n".format(len(catalog.frames)) + create_small_table(objects))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cataloguing the segments of Waymo")
+    parser.add_argument("--source", required=True, help="provide source path to waymo", type=str)
+    parser.add_argument("--dest", required=True, help="provide destination path", type=str)
+    parser.add_argument(
+        "--type",
+        default="train",
+        help="type of the catalogued data, in ['train', 'val', 'test', 'all']",
+        type=str,
+    )
+    parser.add_argument("--overwrite", action="store_true", help="build the catalogs again")
+    parser.add_argument(
+        "--time-of-day", default="", help="e.g. 'Day' or 'Night,Dawn/Dusk'", type=str
+    )
+    parser.add_argument("--location", default="", help="e.g. 'location_sf'", type=str)
+    parser.add_argument("--weather", default="", help="e.g. 'sunny' or 'rain'", type=str)
+    parser.add_argument(
+        "--min-objects",
+        default="",
+        help="the least objects in a frame, e.g. 'pedestrian=5,cyclist=1'",
+        type=str,
+    )
+    parser.add_argument(
+        "--percentage", default=1.0, help="the percentage of the frames to sample", type=float
+    )
+    parser.add_argument(
+        "--seed", default=20200319, help="random seed for sampling the frames", type=int
+    )
+    parser.add_argument(
+        "--output",
+        default="",
+        help="name of the split.txt of the frames left, written in the dest of every fold",
+        type=str,
+    )
+    args = parser.parse_args()
+    assert args.type in FOLDS
+
+    for fold in FOLDS[args.type]:
+        source_dir = os.path.join(args.source, fold)
+        save_dir = os.path.join(args.dest, fold.replace("_seg", ""))
+        catalog = load_catalog(source_dir, save_dir, args.overwrite)
+        catalog = catalog.filter(
+            time_of_day=_values(args.time_of_day),
+            location=_values(args.location),
+            weather=_values(args.weather),
+            min_objects=parse_object_counts(args.min_objects),
+        )
+        logger.info("{} segments and {} frames left".format(len(catalog), len(catalog.frames)))
+        describe(catalog)
+
+        if args.output:
+            timestamps = catalog.timestamps()
+            if args.percentage < 1.0:
+                timestamps = select_subset(timestamps, args.percentage, args.seed)
+            path = os.path.join(save_dir, args.output)
+            save_split(path, timestamps)
+            logger.info("{} frames saved to {}".format(len(timestamps), path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import os
+
+import numpy as np
+
+from waymo_toolkit.protos import dataset_pb2 as open_dataset
+from waymo_toolkit.utils import range_image_utils
+from waymo_toolkit.utils.logger import setup_logger
+from waymo_toolkit.utils.proto_utils import parse_into
+from waymo_toolkit.utils.tfrecord import TFRecordReader
+
+logger = setup_logger("extractor")
+
+COLUMNS = ["points", "range", "intensity", "elongation", "cp"]
+
+
+def _compare(expected, actual, atol: float, what: str) -> None:
+    for name, e, a in zip(COLUMNS, expected, actual):
+        assert e.shape == a.shape, "{} {}: {} != {}".format(what, name, e.shape, a.shape)
+        assert e.dtype == a.dtype, "{} {}: {} != {}".format(what, name, e.dtype, a.dtype)
+        np.testing.assert_allclose(a, e, rtol=0, atol=atol, err_msg="{} {}".format(what, name))
+
+
+def check_engines(frame: open_dataset.Frame, atol: float) -> None:
+    """Check the numpy engine gives the same point cloud as the tensorflow one.
+    """
+    from waymo_toolkit.utils.frame_utils import (
+        convert_range_image_to_point_cloud,
+        parse_range_image_and_camera_projection,
+    )
+
+    expected = convert_range_image_to_point_cloud(
+        frame, *parse_range_image_and_camera_projection(frame)
+    )
+    actual = range_image_utils.convert_range_image_to_point_cloud(
+        frame, *range_image_utils.parse_range_image_and_camera_projection(frame)
+    )
+    _compare(expected, actual, atol, "tf")
+
+
+def check_cache(
+    frame: open_dataset.Frame, cache: range_image_utils.BeamDirectionCache, atol: float
+) -> None:
+    """Check the beam directions of the cache give the same point cloud as computing them.
+    """
+    parsed = range_image_utils.parse_range_image_and_camera_projection(frame)
+    expected = range_image_utils.convert_range_image_to_point_cloud(frame, *parsed)
+    actual = range_image_utils.convert_range_image_to_point_cloud(frame, *parsed, cache=cache)
+    _compare(expected, actual, atol, "cache")
+
+
+def check_kernel(frame: open_dataset.Frame, atol: float) -> bool:
+    """Check the numba kernel of the top lidar gives the same points as the vectorized
+    numpy path, return False if numba is not installed.
+    """
+    if range_image_utils._top_point_cloud_kernel() is None:
+        return False
+    range_images, _, top_pose = range_image_utils.parse_range_image_and_camera_projection(
+        frame, [open_dataset.LaserName.TOP]
+    )
+    calibration = [
+        _ for _ in frame.context.laser_calibrations if _.name == open_dataset.LaserName.TOP
+    ][0]
+    extrinsic = np.reshape(np.array(calibration.extrinsic.transform), [4, 4])
+    frame_pose = np.reshape(np.array(frame.pose.transform), [4, 4])
+    for ri_index, range_image in enumerate(range_images[open_dataset.LaserName.TOP]):
+        if range_image is None:
+            continue
+        inclination = range_image_utils.get_beam_inclinations(calibration, range_image.shape[0])
+        mask = np.logical_and(range_image[..., 0] > 0, range_image[..., -1] != 1)
+        points = [
+            range_image_utils.extract_point_cloud_from_range_image(
+                range_image[..., 0],
+                extrinsic,
+                inclination,
+                mask,
+                pixel_pose=top_pose,
+                frame_pose=frame_pose,
+                kernel=kernel,
+            )
+            for kernel in [False, True]
+        ]
+        np.testing.assert_allclose(
+            points[1], points[0], rtol=0, atol=atol, err_msg="kernel {}".format(ri_index)
+        )
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the laser engines on a segment")
+    parser.add_argument(
+        "--source", default="", help="provide path to a tfrecord, or a synthetic one", type=str
+    )
+    parser.add_argument(
+        "--work-dir", default="/tmp/waymo_toolkit_benchmark", help="the scratch dir", type=str
+    )
+    parser.add_argument("--frames", default=10, help="the number of frames to check", type=int)
+    parser.add_argument("--seed", default=20200319, help="random seed for the data", type=int)
+    parser.add_argument("--atol", default=1e-3, help="tolerance of the points in meter", type=float)
+    parser.add_argument(
+        "--numpy-atol",
+        default=1e-4,
+        help="tolerance in meter of the cached directions and the numba kernel",
+        type=float,
+    )
+    args = parser.parse_args()
+
+    source = args.source
+    if not source:
+        from waymo_toolkit.utils.synthetic import make_segment
+
+        os.makedirs(args.work_dir, exist_ok=True)
+        # without images, so not the segment of tools/benchmark.py
+        source = os.path.join(args.work_dir, "laser-{}-{}.tfrecord".format(args.seed, args.frames))
+        if not os.path.isfile(source):
+            logger.info("Generating {}".format(source))
+            make_segment(source, "check", args.frames, args.seed, images=False)
+
+    try:
+        import tensorflow  # noqa: F401
+        import waymo_open_dataset  # noqa: F401
+
+        engines = True
+    except ImportError:
+        engines = False
+        logger.warning("tensorflow or waymo_open_dataset is missing, the tf engine is skipped")
+
+    # the cache is shared by the frames, so the later ones check the cached directions
+    cache = range_image_utils.BeamDirectionCache()
+    frame = open_dataset.Frame()
+    kernel = True
+    with TFRecordReader(source) as reader:
+        for k in range(min(args.frames, len(reader))):
+            parse_into(frame, reader[k])
+            if engines:
+                check_engines(frame, args.atol)
+            check_cache(frame, cache, args.numpy_atol)
+            kernel = check_kernel(frame, args.numpy_atol)
+            logger.info("{} passed".format(frame.timestamp_micros))
+    if not kernel:
+        logger.warning("numba is not installed, the top lidar kernel is not checked")
+    logger.info("Beam direction cache: {}".format(cache.stats()))
+    assert cache.hits > 0, "the cached directions were never used"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import argparse
+import time
+
+from waymo_toolkit.utils.label_table import LabelTable, build_label_table, save_label_table
+from waymo_toolkit.utils.logger import setup_logger
+
+logger = setup_logger("extractor")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gathering the labels of a split into a table")
+    parser.add_argument(
+        "--source",
+        required=True,
+        help="provide the extracted split, e.g. /path/to/save_dir/training",
+        type=str,
+    )
+    args = parser.parse_args()
+
+    start = time.time()
+    table = build_label_table(args.source)
+    table_dir = save_label_table(args.source, table)
+    logger.info(
+        "{} boxes of {} frames saved to {} ({:.1f}s)".format(
+            len(table["labels"]), len(table["timestamps"]), table_dir, time.time() - start
+        )
+    )
+
+    start = time.time()
+    table = LabelTable(args.source)
+    boxes = sum(len(table[i]) for i in range(len(table)))
+    logger.info("{} boxes loaded back in {:.3f}s".format(boxes, time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,265 @@
 import argparse
+import functools
+import multiprocessing as mp
 import os
+import time
+import zlib
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
-import tensorflow as tf
 
-from waymo_toolkit.extractor import ImageExtractor, LabelExtractor, LaserExtractor
+from waymo_toolkit.extractor import (
+    AsyncWriter,
+    FusedExtractor,
+    ImageExtractor,
+    LabelExtractor,
+    LaserExtractor,
+    Manifest,
+    Profiler,
+    log_protobuf_backend,
+)
+from waymo_toolkit.protos import dataset_pb2 as open_dataset
+from waymo_toolkit.utils.laser_io import parse_encodings
 from waymo_toolkit.utils.logger import setup_logger
+from waymo_toolkit.utils.shard import ShardWriter, list_records
+from waymo_toolkit.utils.split import load_split, save_split, segment_timestamps, select_subset
+from waymo_toolkit.utils.tfrecord import TFRecordReader
+
+if TYPE_CHECKING:
+    import tensorflow as tf
 
 logger = setup_logger("extractor")
 
 
+def parse_lidars(lidars: str) -> Optional[List[int]]:
+    if lidars == "all":
+        return None
+    return [open_dataset.LaserName.Name.Value(_.strip().upper()) for _ in lidars.split(",")]
+
+
+def output_configs(args) -> Dict[str, Dict[str, Any]]:
+    """Return the options changing the outputs of each kind, recorded in the manifest so
+    the segments extracted with other options are extracted again.
+    """
+    lidars = parse_lidars(args.lidars)
+    configs = {
+        "image": {"scale": args.image_scale, "format": args.image_format},
+        "label": {"format": args.label_format},
+        "laser": {
+            "format": args.laser_format,
+            "lidars": None if lidars is None else sorted(lidars),
+            "returns": args.returns,
+            "encoding": parse_encodings(args.laser_encoding),
+            "compression": args.laser_compression or None,
+        },
+    }
+    for config in configs.values():
+        config["layout"] = args.layout
+    return configs
+
+
+def extract_dataset(
+    dataset: "tf.data.TFRecordDataset", save_dir: str, kinds: List[str], args, prefix: str = ""
+) -> Tuple[Dict[str, Dict[str, int]], Profiler]:
+    writer = None
+    if args.layout == "shards":
+        # the shards of a segment are named after it and the kinds in them, so extracting
+        # the segment again replaces them instead of adding duplicates
+        writer = ShardWriter(
+            save_dir, "{}.{}".format(prefix, "-".join(kinds)), args.shard_size << 20
+        )
+    elif args.writers > 0:
+        writer = AsyncWriter(args.writers, args.write_buffer << 20)
+
+    sinks = []
+    if "image" in kinds:
+        sinks.append(
+            ImageExtractor(
+                dataset,
+                save_dir,
+                scale=args.image_scale,
+                image_format=args.image_format,
+                writer=writer,
+            )
+        )
+    if "label" in kinds:
+        sinks.append(LabelExtractor(dataset, save_dir, writer, args.label_format))
+    if "laser" in kinds:
+        sinks.append(
+            LaserExtractor(
+                dataset,
+                save_dir,
+                engine=args.laser_engine,
+                laser_names=parse_lidars(args.lidars),
+                ri_indexes={"1": [0], "2": [1], "both": [0, 1]}[args.returns],
+                laser_format=args.laser_format,
+                writer=writer,
+                encodings=parse_encodings(args.laser_encoding),
+                compression=args.laser_compression or None,
+            )
+        )
+
+    if len(sinks) == 1:
+        # a single extractor may know a cheaper way to walk the records
+        extractor = sinks[0]
+    else:
+        # read and parse every frame once for all the extractors
+        extractor = FusedExtractor(dataset, save_dir, sinks, writer)
+    try:
+        extractor.extract()
+    finally:
+        if writer is not None:
+            writer.close()
+    return {sink.name: sink.stats() for sink in sinks}, extractor.profiler
+
+
+def _init_worker(use_tf: bool) -> None:
+    if not use_tf:
+        return
+    # every worker owns one core, so keep tensorflow from spawning its own thread pools
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(1)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def _select(dataset: "tf.data.TFRecordDataset", indices: np.ndarray) -> Iterator[Any]:
+    # tf.data reads the records in between, but they are not parsed
+    selected = set(indices.tolist())
+    last = max(selected, default=-1)
+    for k, data in enumerate(dataset):
+        if k > last:
+            return
+        if k in selected:
+            yield data
+
+
+def extract_segment(
+    task: Tuple[str, List[str], Optional[np.ndarray]], save_dir: str, args
+) -> Tuple[str, Dict[str, Dict[str, int]], Profiler, float]:
+    filename, kinds, indices = task
+    start = time.time()
+    prefix = os.path.splitext(os.path.basename(filename))[0]
+    reader = None
+    try:
+        if args.reader == "python":
+            reader = TFRecordReader(filename, check_crc=args.check_crc)
+            dataset = reader if indices is None else reader.select(indices)
+        else:
+            # tensorflow takes seconds to import, so only load it for its reader
+            import tensorflow as tf
+
+            dataset = tf.data.TFRecordDataset([filename])
+            if indices is not None:
+                dataset = _select(dataset, indices)
+        stats, profiler = extract_dataset(dataset, save_dir, kinds, args, prefix)
+    finally:
+        if reader is not None:
+            reader.close()
+    return filename, stats, profiler, time.time() - start
+
+
+def select_frames(files: List[str], save_dir: str, args) -> Dict[str, np.ndarray]:
+    """Select the frames before extracting them, either a random subset of the frames of
+    the tfrecords, or the frames of an existing split. Return the indices of their records.
+    """
+    timestamps = {filename: segment_timestamps(filename) for filename in files}
+    if args.split:
+        # the split is only read, so it does not replace the split.txt of the save dir
+        selected = load_split(args.split)
+        # the split may hold the frames of several folds, keep those of this one
+        selected = selected[np.isin(selected, np.concatenate(list(timestamps.values())))]
+    else:
+        selected = select_subset(
+            np.concatenate(list(timestamps.values())), args.percentage, args.seed
+        )
+        os.makedirs(save_dir, exist_ok=True)
+        save_split(os.path.join(save_dir, "split.txt"), selected)
+    total = sum(len(_) for _ in timestamps.values())
+    logger.info("{} of {} frames in {} selected".format(len(selected), total, save_dir))
+    return {
+        filename: np.flatnonzero(np.isin(segment, selected))
+        for filename, segment in timestamps.items()
+    }
+
+
+def _subset_name(indices: Optional[np.ndarray]) -> Optional[str]:
+    if indices is None:
+        return None
+    indices = np.asarray(indices, dtype=np.int64)
+    return "{}:{:08x}".format(len(indices), zlib.crc32(indices.tobytes()))
+
+
 def extract(source_dir: str, save_dir: str, args):
     files = os.listdir(source_dir)
-    files = [os.path.join(source_dir, _) for _ in files if _.endswith("tfrecord")]
+    files = sorted([os.path.join(source_dir, _) for _ in files if _.endswith("tfrecord")])
     assert len(files) > 0
 
-    dataset = tf.data.TFRecordDataset(files)
+    kinds = [kind for kind in ["image", "label", "laser"] if getattr(args, kind)]
+    subset_first = args.subset and args.subset_first
+    records = {}
+    if args.split or subset_first:
+        records = select_frames(files, save_dir, args)
 
-    if args.image:
-        imgext = ImageExtractor(dataset, save_dir)
-        imgext.extract()
+    manifest = Manifest(save_dir)
+    configs = output_configs(args)
+    tasks = []
+    for filename in files:
+        indices = records.get(filename)
+        if indices is not None and len(indices) == 0:
+            continue
+        subset = _subset_name(indices)
+        pending = kinds if args.overwrite else manifest.pending(filename, kinds, subset, configs)
+        if len(pending) > 0:
+            tasks.append((filename, pending, indices))
+    logger.info("{} of {} segments in {} to extract".format(len(tasks), len(files), source_dir))
 
-    if args.label:
-        labext = LabelExtractor(dataset, save_dir)
-        labext.extract()
+    if len(tasks) > 0:
+        # a segment stays marked as running until all of its outputs are written, so the
+        # partially written files of an interrupted run are extracted again on resuming
+        manifest.start([task[:2] for task in tasks])
 
-    if args.laser:
-        lasext = LaserExtractor(dataset, save_dir)
-        lasext.extract()
+        total = len(tasks)
+        profiler = Profiler()
+        start = last_log = time.time()
+        func = functools.partial(extract_segment, save_dir=save_dir, args=args)
+        if args.workers > 1:
+            # hand whole segments to the workers, the output names do not depend on the order
+            ctx = mp.get_context("spawn")
+            use_tf = args.reader == "tf" or (args.laser and args.laser_engine == "tf")
+            pool = ctx.Pool(min(args.workers, total), initializer=_init_worker, initargs=(use_tf,))
+            results = pool.imap_unordered(func, tasks)
+        else:
+            pool = None
+            results = map(func, tasks)
 
-    if args.subset:
-        seed = args.seed
-        percentage = args.percentage
+        for i, (filename, stats, segment_profiler, elapsed) in enumerate(results):
+            manifest.finish(filename, stats, _subset_name(records.get(filename)), configs)
+            profiler.merge(segment_profiler)
+            logger.info(
+                "[{}/{}] {} ({:.1f}s)".format(i + 1, total, os.path.basename(filename), elapsed)
+            )
+            if time.time() - last_log > args.profile_interval:
+                profiler.log(time.time() - start)
+                last_log = time.time()
 
-        files = sorted(
-            [int(_.replace(".pb", "")) for _ in os.listdir(os.path.join(save_dir, "label"))]
-        )
-        files = np.array(files)
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+        # the stages sum the time of all the workers, the total is the wall time
+        profiler.log(time.time() - start)
+        profiler.dump(os.path.join(save_dir, "profile.json"), time.time() - start)
+
+    if args.subset and not subset_first and not args.split:
+        files = np.array([int(_) for _ in list_records(save_dir, "label", ".pb")])
         total = len(files)
         logger.info(
             "{} frames in {} totally".format(total, save_dir)
         )  # training: 158081  # validation: 39987
 
-        np.random.seed(seed)
-        index = np.random.choice(total, int(percentage * total), replace=False)
-        selected = files[index]
-        np.savetxt(os.path.join(save_dir, "split.txt"), selected)
+        selected = select_subset(files, args.percentage, args.seed)
+        save_split(os.path.join(save_dir, "split.txt"), selected)
 
 
 def main():
@@ -58,20 +272,118 @@ def main():
         help="type of the extrated data, in ['train', 'val', 'test', 'all']",
         type=str,
     )
+    parser.add_argument(
+        "--reader",
+        default="tf",
+        help="reader of the tfrecords, in ['tf', 'python'], python mmaps them without tf",
+        type=str,
+    )
+    parser.add_argument(
+        "--check-crc", action="store_true", help="check the crc of the records, python reader"
+    )
     parser.add_argument("--image", action="store_true", help="whether to extract images")
+    parser.add_argument(
+        "--image-scale", default=1.0, help="the scale to resize the images", type=float
+    )
+    parser.add_argument(
+        "--image-format", default="jpg", help="format of the images, in ['jpg', 'png']", type=str
+    )
     parser.add_argument("--label", action="store_true", help="whether to extract labels")
+    parser.add_argument(
+        "--label-format",
+        default="full",
+        help="format of the labels, in ['full', 'slim'], slim ones leave out the calibrations",
+        type=str,
+    )
     parser.add_argument("--laser", action="store_true", help="whether to extract lasers")
+    parser.add_argument(
+        "--laser-engine",
+        default="tf",
+        help="engine converting the range images, in ['tf', 'numpy']",
+        type=str,
+    )
+    parser.add_argument(
+        "--laser-format",
+        default="files",
+        help="layout of the laser outputs, in ['files', 'packed', 'range']",
+        type=str,
+    )
+    parser.add_argument(
+        "--laser-encoding",
+        default="raw",
+        help="encodings of the packed columns, 'raw', 'compact' or e.g. 'xyz=float16,cp=int16'",
+        type=str,
+    )
+    parser.add_argument(
+        "--laser-compression",
+        default="",
+        help="compressor of the packed or range lasers, in ['', 'zlib', 'lz4']",
+        type=str,
+    )
+    parser.add_argument(
+        "--lidars",
+        default="all",
+        help="lasers to extract, 'all' or a list like 'TOP,FRONT,SIDE_LEFT,SIDE_RIGHT,REAR'",
+        type=str,
+    )
+    parser.add_argument(
+        "--returns", default="both", help="returns to extract, in ['1', '2', 'both']", type=str
+    )
     parser.add_argument("--subset", action="store_true", help="whether to extract the subset")
     parser.add_argument(
         "--seed", default=20200319, help="random seed for select the subset", type=int
     )
     parser.add_argument("--percentage", default=0.1, help="the percentage of subset", type=float)
+    parser.add_argument(
+        "--subset-first",
+        action="store_true",
+        help="select the subset from the tfrecords first, and only extract its frames",
+    )
+    parser.add_argument(
+        "--split", default="", help="only extract the frames of this split.txt", type=str
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true", help="extract the segments in the manifest again"
+    )
+    parser.add_argument(
+        "--writers", default=0, help="the number of threads writing files, 0 for sync", type=int
+    )
+    parser.add_argument(
+        "--write-buffer", default=256, help="the max MB of files queued to write", type=int
+    )
+    parser.add_argument(
+        "--layout",
+        default="dirs",
+        help="layout of the outputs, in ['dirs', 'shards'], one file per record or shards",
+        type=str,
+    )
+    parser.add_argument(
+        "--shard-size", default=1024, help="the max MB of records in one shard", type=int
+    )
+    parser.add_argument(
+        "--profile-interval",
+        default=60,
+        help="the seconds between printing the time of the stages",
+        type=float,
+    )
+    parser.add_argument(
+        "--workers", default=1, help="the number of processes extracting segments", type=int
+    )
 
     args = parser.parse_args()
 
     source_dir = args.source
     save_dir = args.dest
     assert args.type in ["train", "val", "test", "all"]
+    assert args.returns in ["1", "2", "both"]
+    assert args.laser_format in ["files", "packed", "range"]
+    assert args.laser_compression in ["", "zlib", "lz4"]
+    assert args.label_format in ["full", "slim"]
+    assert args.layout in ["dirs", "shards"]
+    assert args.reader in ["tf", "python"]
+    if args.subset_first:
+        args.subset = True
+    log_protobuf_backend()
 
     if args.type == "all":
         for fold in ["training_seg", "validation_seg", "testing_seg"]:
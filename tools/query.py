@@ -0,0 +1,93 @@
+import argparse
+import os
+import time
+from typing import List, Optional
+
+from waymo_toolkit.utils.catalog import parse_object_counts
+from waymo_toolkit.utils.frame_index import (
+    FRAME_INDEX,
+    FrameIndex,
+    build_frame_index,
+    save_frame_index,
+)
+from waymo_toolkit.utils.logger import setup_logger
+from waymo_toolkit.utils.split import save_split
+
+logger = setup_logger("extractor")
+
+
+def _values(values: str) -> Optional[List[str]]:
+    return [_.strip() for _ in values.split(",")] if values else None
+
+
+def load_frame_index(source_dir: str, rebuild: bool) -> FrameIndex:
+    if rebuild or not os.path.isfile(os.path.join(source_dir, FRAME_INDEX)):
+        start = time.time()
+        path = save_frame_index(source_dir, build_frame_index(source_dir))
+        logger.info("Frame index saved to {} ({:.1f}s)".format(path, time.time() - start))
+    return FrameIndex(source_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Querying the frames of an extracted split")
+    parser.add_argument(
+        "--source",
+        required=True,
+        help="provide the extracted split, e.g. /path/to/save_dir/training",
+        type=str,
+    )
+    parser.add_argument("--rebuild", action="store_true", help="build the frame index again")
+    parser.add_argument(
+        "--time-of-day", default="", help="e.g. 'Day' or 'Night,Dawn/Dusk'", type=str
+    )
+    parser.add_argument("--location", default="", help="e.g. 'location_sf'", type=str)
+    parser.add_argument("--weather", default="", help="e.g. 'sunny' or 'rain'", type=str)
+    parser.add_argument(
+        "--min-objects",
+        default="",
+        help="the least objects in a frame, e.g. 'pedestrian=5,cyclist=1'",
+        type=str,
+    )
+    parser.add_argument(
+        "--max-objects", default="", help="the most objects in a frame, e.g. 'vehicle=0'", type=str
+    )
+    parser.add_argument(
+        "--within",
+        default=None,
+        help="only count the laser boxes within this distance in meters, e.g. 30",
+        type=float,
+    )
+    parser.add_argument("--camera", action="store_true", help="count the camera boxes instead")
+    parser.add_argument(
+        "--output",
+        default="",
+        help="name of the split.txt of the frames found, written in the source",
+        type=str,
+    )
+    args = parser.parse_args()
+
+    index = load_frame_index(args.source, args.rebuild)
+    start = time.time()
+    timestamps = index.query(
+        min_objects=parse_object_counts(args.min_objects),
+        max_objects=parse_object_counts(args.max_objects),
+        within=args.within,
+        time_of_day=_values(args.time_of_day),
+        location=_values(args.location),
+        weather=_values(args.weather),
+        camera=args.camera,
+    )
+    logger.info(
+        "{} of {} frames found in {:.2f}ms".format(
+            len(timestamps), len(index), (time.time() - start) * 1000
+        )
+    )
+
+    if args.output:
+        path = os.path.join(args.source, args.output)
+        save_split(path, timestamps)
+        logger.info("{} frames saved to {}".format(len(timestamps), path))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,16 @@ import os
 
 import numpy as np
 
-from waymo_toolkit.utils.ransac import ransac
+from waymo_toolkit.utils.laser_io import list_laser_frames, load_laser
 
 
-def run(filename, laser_dir, save_dir, iterations, threshold, stop, seed):
+def run(filename, base_dir, save_dir, iterations, threshold, stop, seed):
+    # numba compiles ransac on import, so leave it to the workers
+    from waymo_toolkit.utils.ransac import ransac
+
     print(filename)
-    laser_path = os.path.join(laser_dir, "{}.bin".format(filename))
     save_path = os.path.join(save_dir, "{}.txt".format(filename))
-    laser = np.fromfile(laser_path, dtype=np.float32).reshape(-1, 3)
+    laser = np.ascontiguousarray(load_laser(base_dir, filename)["xyz"], dtype=np.float32)
     m = ransac(laser, int(0.2 * len(laser)), iterations, threshold, stop, seed)
     np.savetxt(save_path, m)
 
@@ -27,13 +29,15 @@ def main():
         "--stop", default=False, help="stop at the inliers surpass the upper", type=bool
     )
     parser.add_argument("--seed", default=20200319, help="random seed for ransac", type=int)
+    parser.add_argument(
+        "--split", default="", help="only fit the frames of this split.txt", type=str
+    )
     args = parser.parse_args()
 
     base_dir = args.source
-    laser_dir = os.path.join(base_dir, "laser")
     save_dir = os.path.join(base_dir, "plane")
     os.makedirs(save_dir, exist_ok=True)
-    files = [int(_.replace(".bin", "")) for _ in os.listdir(laser_dir) if _.endswith("bin")]
+    files = [int(_) for _ in list_laser_frames(base_dir, args.split)]
     total = len(files)
 
     pool = mp.Pool(mp.cpu_count())
@@ -41,7 +45,7 @@ def main():
         run,
         zip(
             files,
-            [laser_dir] * total,
+            [base_dir] * total,
             [save_dir] * total,
             [args.iterations] * total,
             [args.threshold] * total,
@@ -0,0 +1,36 @@
+import argparse
+import os
+
+from waymo_toolkit.utils.logger import setup_logger
+from waymo_toolkit.utils.synthetic import make_segment
+
+logger = setup_logger("extractor")
+
+
+def synthesize(save_dir: str, num_segments: int, num_frames: int, seed: int, images: bool):
+    """Write synthetic segments laid out like the waymo dataset, e.g. training_seg/*.tfrecord.
+    """
+    for i, fold in enumerate(["training_seg", "validation_seg", "testing_seg"]):
+        fold_dir = os.path.join(save_dir, fold)
+        os.makedirs(fold_dir, exist_ok=True)
+        for j in range(num_segments):
+            name = "synthetic-{}-{:04d}".format(fold.replace("_seg", ""), j)
+            path = os.path.join(fold_dir, "segment-{}.tfrecord".format(name))
+            make_segment(path, name, num_frames, seed + i * num_segments + j, images)
+            logger.info("{} ({} frames)".format(path, num_frames))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generating a synthetic Waymo dataset")
+    parser.add_argument("--dest", required=True, help="provide destination path", type=str)
+    parser.add_argument("--segments", default=1, help="the number of segments per fold", type=int)
+    parser.add_argument("--frames", default=20, help="the number of frames per segment", type=int)
+    parser.add_argument("--seed", default=20200319, help="random seed for the content", type=int)
+    parser.add_argument("--no-images", action="store_true", help="leave out the camera images")
+    args = parser.parse_args()
+
+    synthesize(args.dest, args.segments, args.frames, args.seed, not args.no_images)
+
+
+if __name__ == "__main__":
+    main()
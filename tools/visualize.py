@@ -1,13 +1,14 @@
 import argparse
 
-from waymo_toolkit.viewer import Viewer2D, Viewer3D
-
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--source", required=True, help="provide source path to visualize", type=str
     )
+    parser.add_argument(
+        "--split", default="", help="only show the frames of this split.txt", type=str
+    )
     parser.add_argument("--image", action="store_true", help="whether to show image")
     parser.add_argument("--laser", action="store_true", help="whether to show laser")
     parser.add_argument("--reduce", action="store_true", help="whether to show reduce laser")
@@ -20,11 +21,16 @@ def main():
     parser.add_argument("--project", action="store_true", help="draw the projected laser on image")
     args = parser.parse_args()
 
+    # import the viewers only when used, the 3D one loads mayavi
     if args.image:
+        from waymo_toolkit.viewer.viewer_2d import Viewer2D
+
         viewer2d = Viewer2D(args)
         viewer2d.display(camera=args.camera, step=args.step)
 
     if args.laser:
+        from waymo_toolkit.viewer.viewer_3d import Viewer3D
+
         viewer3d = Viewer3D(args)
         viewer3d.display(step=args.step)
 
@@ -1,3 +1,8 @@
+from .extractor import log_protobuf_backend
+from .fused import FusedExtractor
 from .image import ImageExtractor
 from .label import LabelExtractor
 from .laser import LaserExtractor
+from .manifest import Manifest
+from .profiler import Profiler
+from .writer import AsyncWriter
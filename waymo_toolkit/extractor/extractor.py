@@ -1,16 +1,142 @@
-from typing import Any
+import functools
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional
 
-import tensorflow as tf
+from waymo_toolkit.protos import dataset_pb2 as open_dataset
+from waymo_toolkit.utils.logger import setup_logger
+from waymo_toolkit.utils.proto_utils import parse_fields, parse_into, protobuf_backend
+from waymo_toolkit.utils.shard import ShardWriter
+
+from .profiler import Profiler
+from .writer import AsyncWriter
+
+if TYPE_CHECKING:
+    import tensorflow as tf
+
+logger = setup_logger("extractor")
+
+
+@functools.lru_cache(maxsize=1)
+def log_protobuf_backend() -> str:
+    """Log the implementation of protobuf parsing the frames, once per process.
+    """
+    backend = protobuf_backend()
+    if backend == "python":
+        logger.warning(
+            "protobuf parses the frames in pure python, many times slower than upb or cpp, "
+            "see tools/benchmark_protobuf.py"
+        )
+    else:
+        logger.info("protobuf parses the frames with {}".format(backend))
+    return backend
 
 
 class Extractor:
-    def __init__(self, dataset: tf.data.TFRecordDataset, save_dir: str):
+    # the kind of output, used to record the progress in the manifest
+    name = ""
+    # the top-level fields of Frame read by process, see waymo_toolkit.utils.wire, the others
+    # are skipped by their length without being parsed, None parses all of them
+    fields = None
+
+    def __init__(
+        self,
+        dataset: "tf.data.TFRecordDataset",
+        save_dir: str,
+        writer: Optional[AsyncWriter] = None,
+    ):
         self._dataset = dataset
         self._save_dir = save_dir
+        self._writer = writer
         self._cnt = 0
+        self._frames = 0
+        self._bytes = 0
+        self._profiler = Profiler()
+
+    @property
+    def profiler(self) -> Profiler:
+        return self._profiler
+
+    @profiler.setter
+    def profiler(self, profiler: Profiler) -> None:
+        self._profiler = profiler
 
     def _save(self, path: str, data: Any) -> None:
         raise NotImplementedError
 
-    def extract(self) -> None:
+    def _path(self, folder: str, base_name: str) -> str:
+        base_dir = os.path.join(self._save_dir, folder)
+        # the shards only take the folder as the kind of the record
+        if not isinstance(self._writer, ShardWriter):
+            os.makedirs(base_dir, exist_ok=True)
+        return os.path.join(base_dir, base_name)
+
+    def _write(self, path: str, data: Any) -> None:
+        """Write `data`, any object supporting the buffer protocol, to `path`.
+        """
+        self._cnt += 1
+        if self._cnt % 1000 == 1:
+            logger.info("{:08d} : {}".format(self._cnt, path))
+        nbytes = memoryview(data).nbytes
+        self._bytes += nbytes
+        # the time of an async write is how long the queue blocks the caller
+        with self._profiler.stage("write", bytes_out=nbytes):
+            if self._writer is not None:
+                self._writer.write(path, data)
+            else:
+                with open(path, "wb") as fout:
+                    fout.write(data)
+
+    def process(self, frame: open_dataset.Frame) -> None:
+        """Extract the elements from one parsed frame.
+        The frame may be shared with other extractors, so it must not be modified.
+        """
         raise NotImplementedError
+
+    def _process(self, frame: open_dataset.Frame) -> None:
+        with self._profiler.stage(self.name):
+            self.process(frame)
+
+    def _end_frame(self) -> None:
+        if self._writer is not None:
+            self._profiler.gauge("write queue", self._writer.pending)
+            self._profiler.gauge("write queue MB", self._writer.pending_bytes / (1 << 20))
+        self._profiler.end_frame()
+
+    def close(self) -> None:
+        if self._writer is not None:
+            errors = self._writer.flush()
+            for path, e in errors:
+                logger.error("Failed to write {}: {}".format(path, e))
+            if len(errors) > 0:
+                raise IOError("{} files failed to write".format(len(errors)))
+
+    def stats(self) -> Dict[str, int]:
+        return {"frames": self._frames, "files": self._cnt, "bytes": self._bytes}
+
+    def _records(self) -> Iterator[Any]:
+        records = iter(self._dataset)
+        while True:
+            start = time.perf_counter()
+            data = next(records, None)
+            if data is None:
+                return
+            # tf.data yields tensors, TFRecordReader yields the bytes of the records
+            data = data.numpy() if hasattr(data, "numpy") else data
+            self._profiler.add("read", time.perf_counter() - start, memoryview(data).nbytes)
+            yield data
+
+    def extract(self) -> None:
+        log_protobuf_backend()
+        # one frame parsed again and again, the extractors keep nothing of the last one
+        frame = open_dataset.Frame()
+        fields = self.fields
+        for data in self._records():
+            with self._profiler.stage("parse"):
+                if fields is None:
+                    parse_into(frame, data)
+                else:
+                    parse_fields(frame, data, fields)
+            self._process(frame)
+            self._end_frame()
+        self.close()
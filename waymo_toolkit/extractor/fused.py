@@ -0,0 +1,64 @@
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from waymo_toolkit.protos import dataset_pb2 as open_dataset
+from waymo_toolkit.utils.logger import setup_logger
+
+from .extractor import Extractor
+from .writer import AsyncWriter
+
+if TYPE_CHECKING:
+    import tensorflow as tf
+
+logger = setup_logger("extractor")
+
+
+class FusedExtractor(Extractor):
+    """Read and parse every frame once, then hand it to all the registered extractors.
+    """
+
+    def __init__(
+        self,
+        dataset: "tf.data.TFRecordDataset",
+        save_dir: str,
+        sinks: List[Extractor],
+        writer: Optional[AsyncWriter] = None,
+    ):
+        super(FusedExtractor, self).__init__(dataset, save_dir, writer)
+        self._sinks = []
+        for sink in sinks:
+            self.register(sink)
+
+    def register(self, sink: Extractor) -> None:
+        # all the stages of a frame are timed by one profiler
+        sink.profiler = self._profiler
+        self._sinks.append(sink)
+
+    @property
+    def fields(self) -> Optional[Tuple[int, ...]]:
+        """The fields read by any of the sinks, None if one of them reads all of them.
+        """
+        fields = set()
+        for sink in self._sinks:
+            if sink.fields is None:
+                return None
+            fields.update(sink.fields)
+        return tuple(sorted(fields))
+
+    @property
+    def sinks(self) -> List[Extractor]:
+        return self._sinks
+
+    def process(self, frame: open_dataset.Frame) -> None:
+        self._frames += 1
+        for sink in self._sinks:
+            sink._process(frame)
+
+    def _process(self, frame: open_dataset.Frame) -> None:
+        # the sinks time their own stages
+        self.process(frame)
+
+    def close(self) -> None:
+        for sink in self._sinks:
+            sink.close()
+        super(FusedExtractor, self).close()
+        logger.info("Finish extracting {} frames".format(self._frames))
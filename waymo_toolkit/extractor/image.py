@@ -1,36 +1,63 @@
-import os
+from typing import TYPE_CHECKING, Optional, Union
 
 import cv2
 import numpy as np
-import tensorflow as tf
 
 from waymo_toolkit.protos import dataset_pb2 as open_dataset
 from waymo_toolkit.utils.logger import setup_logger
+from waymo_toolkit.utils.wire import IMAGES_FIELD, TIMESTAMP_FIELD
 
 from .extractor import Extractor
+from .writer import AsyncWriter
+
+if TYPE_CHECKING:
+    import tensorflow as tf
 
 logger = setup_logger("extractor")
 
 
 class ImageExtractor(Extractor):
-    def __init__(self, dataset: tf.data.TFRecordDataset, save_dir: str):
-        super(ImageExtractor, self).__init__(dataset, save_dir)
-
-    def _save(self, path: str, data: np.ndarray) -> None:
-        self._cnt += 1
-        if self._cnt % 1000 == 1:
-            logger.info("{:08d} : {}".format(self._cnt, path))
-        cv2.imwrite(path, data)
-
-    def extract(self) -> None:
-        for data in self._dataset:
-            frame = open_dataset.Frame()
-            frame.ParseFromString(bytearray(data.numpy()))
-            for i, im in enumerate(frame.images):
-                ima = tf.image.decode_jpeg(im.image).numpy()[:, :, ::-1]
-                base_name = "{}.jpg".format(frame.timestamp_micros)
-                base_dir = os.path.join(self._save_dir, "image_{}".format(i))
-                os.makedirs(base_dir, exist_ok=True)
-                filename = os.path.join(base_dir, base_name)
-                self._save(filename, ima)
+    name = "image"
+    fields = (TIMESTAMP_FIELD, IMAGES_FIELD)
+
+    def __init__(
+        self,
+        dataset: "tf.data.TFRecordDataset",
+        save_dir: str,
+        scale: float = 1.0,
+        image_format: str = "jpg",
+        writer: Optional[AsyncWriter] = None,
+    ):
+        super(ImageExtractor, self).__init__(dataset, save_dir, writer)
+        assert scale > 0
+        assert image_format in ["jpg", "png"]
+        self._scale = scale
+        self._format = image_format
+        # the camera images are stored as jpeg already, so copy the bytes unless transformed
+        self._passthrough = scale == 1.0 and image_format == "jpg"
+
+    def _save(self, path: str, data: Union[bytes, np.ndarray]) -> None:
+        if not isinstance(data, bytes):
+            data = cv2.imencode(".{}".format(self._format), data)[1]
+        self._write(path, data)
+
+    def _transform(self, image: bytes) -> np.ndarray:
+        # decode to BGR as expected by cv2.imencode
+        ima = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if self._scale != 1.0:
+            ima = cv2.resize(
+                ima, None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA
+            )
+        return ima
+
+    def process(self, frame: open_dataset.Frame) -> None:
+        self._frames += 1
+        for i, im in enumerate(frame.images):
+            ima = im.image if self._passthrough else self._transform(im.image)
+            base_name = "{}.{}".format(frame.timestamp_micros, self._format)
+            filename = self._path("image_{}".format(i), base_name)
+            self._save(filename, ima)
+
+    def close(self) -> None:
+        super(ImageExtractor, self).close()
         logger.info("Finish extracting image")
@@ -1,36 +1,96 @@
 import os
-
-import tensorflow as tf
+from typing import TYPE_CHECKING, Optional
 
 from waymo_toolkit.protos import annotation_pb2 as annotation
+from waymo_toolkit.protos import dataset_pb2 as open_dataset
+from waymo_toolkit.utils.label_io import CALIBRATION_DIR, segment_calibration, slim_context
 from waymo_toolkit.utils.logger import setup_logger
+from waymo_toolkit.utils.proto_utils import parse_fields
+from waymo_toolkit.utils.wire import LABEL_FIELDS
+
+from .extractor import Extractor, log_protobuf_backend
+from .writer import AsyncWriter
 
-from .extractor import Extractor
+if TYPE_CHECKING:
+    import tensorflow as tf
 
 logger = setup_logger("extractor")
 
 
 class LabelExtractor(Extractor):
-    def __init__(self, dataset: tf.data.TFRecordDataset, save_dir: str):
-        super(LabelExtractor, self).__init__(dataset, save_dir)
+    name = "label"
+    fields = LABEL_FIELDS
+
+    def __init__(
+        self,
+        dataset: "tf.data.TFRecordDataset",
+        save_dir: str,
+        writer: Optional[AsyncWriter] = None,
+        label_format: str = "full",
+    ):
+        super(LabelExtractor, self).__init__(dataset, save_dir, writer)
+        # "slim" leaves the calibrations out of the labels, they are saved once per segment
+        assert label_format in ["full", "slim"]
+        self._slim = label_format == "slim"
+        self._segments = set()
+        # the labels are serialized before the next frame, so one message is reused
+        self._anno = annotation.Annotation()
 
     def _save(self, path: str, data: annotation.Annotation) -> None:
-        msg = data.SerializeToString()
-        self._cnt += 1
-        if self._cnt % 1000 == 1:
-            logger.info("{:08d} : {}".format(self._cnt, path))
-        with open(path, "wb") as fout:
-            fout.write(msg)
-            fout.close()
+        self._write(path, data.SerializeToString())
 
-    def extract(self) -> None:
-        for data in self._dataset:
-            anno = annotation.Annotation()
-            anno.ParseFromString(bytearray(data.numpy()))
-            anno.DiscardUnknownFields()
-            base_name = "{}.pb".format(anno.timestamp_micros)
-            base_dir = os.path.join(self._save_dir, "label")
-            os.makedirs(base_dir, exist_ok=True)
-            filename = os.path.join(base_dir, base_name)
-            self._save(filename, anno)
+    def _save_calibration(self, context: open_dataset.Context) -> None:
+        """Save the calibrations of the segment of the context, on its first frame.
+        """
+        if context.name in self._segments:
+            return
+        self._segments.add(context.name)
+        # a plain file whatever the layout, there are only a few of them
+        calibration_dir = os.path.join(self._save_dir, CALIBRATION_DIR)
+        os.makedirs(calibration_dir, exist_ok=True)
+        path = os.path.join(calibration_dir, "{}.pb".format(context.name))
+        tmp_path = "{}.{}".format(path, os.getpid())
+        with open(tmp_path, "wb") as fout:
+            fout.write(segment_calibration(context).SerializeToString())
+        os.replace(tmp_path, path)
+
+    def _save_annotation(self, anno: annotation.Annotation) -> None:
+        self._frames += 1
+        self._save_calibration(anno.context)
+        if self._slim:
+            slim_context(anno.context)
+        base_name = "{}.pb".format(anno.timestamp_micros)
+        filename = self._path("label", base_name)
+        self._save(filename, anno)
+
+    def process(self, frame: open_dataset.Frame) -> None:
+        # the field numbers of Annotation line up with Frame, so copy the labelled
+        # fields over instead of parsing the whole frame again
+        anno = self._anno
+        anno.Clear()
+        anno.context.CopyFrom(frame.context)
+        anno.timestamp_micros = frame.timestamp_micros
+        anno.pose.CopyFrom(frame.pose)
+        anno.laser_labels.extend(frame.laser_labels)
+        anno.projected_lidar_labels.extend(frame.projected_lidar_labels)
+        anno.camera_labels.extend(frame.camera_labels)
+        anno.no_label_zones.extend(frame.no_label_zones)
+        self._save_annotation(anno)
+
+    def close(self) -> None:
+        super(LabelExtractor, self).close()
         logger.info("Finish extracting label")
+
+    def extract(self) -> None:
+        log_protobuf_backend()
+        # the field numbers of Annotation line up with Frame, so the labelled fields sliced
+        # from the record parse into it directly, and the images and lasers are never
+        # scanned
+        anno = self._anno
+        for data in self._records():
+            with self._profiler.stage("parse"):
+                parse_fields(anno, data, self.fields)
+            with self._profiler.stage(self.name):
+                self._save_annotation(anno)
+            self._end_frame()
+        self.close()
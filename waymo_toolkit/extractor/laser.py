@@ -1,70 +1,173 @@
+import json
 import os
+from typing import TYPE_CHECKING, Dict, Optional, Sequence
 
 import numpy as np
-import tensorflow as tf
-from waymo_open_dataset.utils.frame_utils import parse_range_image_and_camera_projection
 
 from waymo_toolkit.protos import dataset_pb2 as open_dataset
-from waymo_toolkit.utils.frame_utils import convert_range_image_to_point_cloud
-from waymo_toolkit.utils.logger import setup_logger
+from waymo_toolkit.utils import range_image_utils
+from waymo_toolkit.utils.laser_io import LASER_COLUMNS, PACKED_DIR, RANGE_DIR, pack_range_images
+from waymo_toolkit.utils.logger import create_small_table, setup_logger
+from waymo_toolkit.utils.packed import pack
+from waymo_toolkit.utils.wire import CONTEXT_FIELD, LASERS_FIELD, POSE_FIELD, TIMESTAMP_FIELD
 
 from .extractor import Extractor
+from .writer import AsyncWriter
+
+if TYPE_CHECKING:
+    import tensorflow as tf
 
 logger = setup_logger("extractor")
 
+LASER_META = "laser_meta.json"
+
 
 class LaserExtractor(Extractor):
-    def __init__(self, dataset: tf.data.TFRecordDataset, save_dir: str):
-        super(LaserExtractor, self).__init__(dataset, save_dir)
+    name = "laser"
+    # the calibrations of the context and the pose are needed besides the lasers
+    fields = (CONTEXT_FIELD, TIMESTAMP_FIELD, POSE_FIELD, LASERS_FIELD)
+
+    def __init__(
+        self,
+        dataset: "tf.data.TFRecordDataset",
+        save_dir: str,
+        engine: str = "tf",
+        laser_names: Optional[Sequence[int]] = None,
+        ri_indexes: Sequence[int] = (0, 1),
+        laser_format: str = "files",
+        writer: Optional[AsyncWriter] = None,
+        encodings: Optional[Dict[str, str]] = None,
+        compression: Optional[str] = None,
+    ):
+        super(LaserExtractor, self).__init__(dataset, save_dir, writer)
+        # the numpy engine gives the same points without the eager tensorflow overhead
+        assert engine in ["tf", "numpy"]
+        assert len(ri_indexes) > 0 and all(_ in [0, 1] for _ in ri_indexes)
+        # "packed" writes all the columns of a frame into a single file, "range" writes
+        # the range images instead of the points
+        assert laser_format in ["files", "packed", "range"]
+        # the separate files have no header to describe an encoding, and the range images
+        # are only compressed, the points are encoded
+        if encodings and laser_format != "packed":
+            raise ValueError(
+                "the encodings need laser_format='packed', not {}".format(laser_format)
+            )
+        if compression is not None and laser_format == "files":
+            raise ValueError("the compression needs laser_format='packed' or 'range'")
+        self._engine = engine
+        self._laser_format = laser_format
+        self._encodings = encodings or {}
+        self._compression = compression
+        # the lasers and returns not selected are neither decompressed nor converted
+        self._laser_names = None if laser_names is None else sorted(laser_names)
+        self._ri_indexes = sorted(ri_indexes)
+        self._cache = range_image_utils.BeamDirectionCache()
+        if laser_format == "files":
+            self._check_meta()
 
     def _save(self, path: str, data: np.ndarray) -> None:
-        self._cnt += 1
-        if self._cnt % 1000 == 1:
-            logger.info("{:08d} : {}".format(self._cnt, path))
-        data.flatten().tofile(path)
-
-    def extract(self) -> None:
-        for data in self._dataset:
-            frame = open_dataset.Frame()
-            frame.ParseFromString(bytearray(data.numpy()))
-            (
-                range_images,
-                camera_projections,
-                range_image_top_pose,
-            ) = parse_range_image_and_camera_projection(frame)
-            points, r_points, i_points, e_points, cp_points = convert_range_image_to_point_cloud(
-                frame, range_images, camera_projections, range_image_top_pose
+        self._write(path, data.flatten())
+
+    def process(self, frame: open_dataset.Frame) -> None:
+        self._frames += 1
+        base_name = "{}.bin".format(frame.timestamp_micros)
+
+        if self._laser_format == "range":
+            # the points are converted when they are loaded, see laser_io.load_laser
+            parsed = range_image_utils.parse_range_image_and_camera_projection(
+                frame, self._laser_names, self._ri_indexes
             )
+            filename = self._path(RANGE_DIR, base_name)
+            compression = "zlib" if self._compression is None else self._compression
+            self._write(filename, pack_range_images(frame, *parsed, self._meta(), compression))
+            return
+
+        if self._engine == "numpy":
+            utils = range_image_utils
+        else:
+            # waymo_open_dataset pulls in tensorflow, so only import it for the tf engine
+            from waymo_toolkit.utils import frame_utils as utils
+
+        parsed = utils.parse_range_image_and_camera_projection(
+            frame, self._laser_names, self._ri_indexes
+        )
+        if self._engine == "numpy":
+            converted = utils.convert_range_image_to_point_cloud(
+                frame, *parsed, cache=self._cache, ri_indexes=self._ri_indexes
+            )
+        else:
+            converted = utils.convert_range_image_to_point_cloud(
+                frame, *parsed, ri_indexes=self._ri_indexes
+            )
+        points, r_points, i_points, e_points, cp_points = converted
+
+        if self._laser_format == "packed":
+            filename = self._path(PACKED_DIR, base_name)
+            columns = dict(zip(LASER_COLUMNS.keys(), converted))
+            packed = pack(
+                columns, self._meta(), compression=self._compression, encodings=self._encodings
+            )
+            self._write(filename, packed)
+            return
+
+        # cartesian
+        filename = self._path("laser", base_name)
+        self._save(filename, points)
+
+        # range
+        filename = self._path("laser_r", base_name)
+        self._save(filename, r_points)
+
+        # intensity
+        filename = self._path("laser_i", base_name)
+        self._save(filename, i_points)
+
+        # elongation
+        filename = self._path("laser_e", base_name)
+        self._save(filename, e_points)
+
+        # cemera projection
+        filename = self._path("laser_cp", base_name)
+        self._save(filename, cp_points)
+
+    def _meta(self) -> dict:
+        # record which lasers and returns the points come from
+        names = self._laser_names
+        if names is None:
+            names = [_ for _ in open_dataset.LaserName.Name.values() if _ != 0]
+        return {
+            "lidars": [open_dataset.LaserName.Name.Name(_) for _ in names],
+            "returns": [_ + 1 for _ in self._ri_indexes],
+        }
+
+    def _check_meta(self) -> None:
+        # the separate files have no header, so all the segments of a split must hold the
+        # lasers and returns recorded in laser_meta.json
+        path = os.path.join(self._save_dir, LASER_META)
+        if not os.path.isfile(path):
+            return
+        with open(path, "r") as fin:
+            meta = json.load(fin)
+        if meta != self._meta():
+            raise ValueError(
+                "{} records {}, not {}, extract the lasers to another dir or remove it".format(
+                    path, meta, self._meta()
+                )
+            )
+
+    def _save_meta(self) -> None:
+        meta = self._meta()
+        path = os.path.join(self._save_dir, LASER_META)
+        tmp_path = "{}.{}".format(path, os.getpid())
+        with open(tmp_path, "w") as fout:
+            json.dump(meta, fout, indent=2)
+        os.replace(tmp_path, path)
 
-            base_name = "{}.bin".format(frame.timestamp_micros)
-
-            # cartesian
-            base_dir = os.path.join(self._save_dir, "laser")
-            os.makedirs(base_dir, exist_ok=True)
-            filename = os.path.join(base_dir, base_name)
-            self._save(filename, points)
-
-            # range
-            base_dir = os.path.join(self._save_dir, "laser_r")
-            os.makedirs(base_dir, exist_ok=True)
-            filename = os.path.join(base_dir, base_name)
-            self._save(filename, r_points)
-
-            # intensity
-            base_dir = os.path.join(self._save_dir, "laser_i")
-            os.makedirs(base_dir, exist_ok=True)
-            filename = os.path.join(base_dir, base_name)
-            self._save(filename, i_points)
-
-            # elongation
-            base_dir = os.path.join(self._save_dir, "laser_e")
-            os.makedirs(base_dir, exist_ok=True)
-            filename = os.path.join(base_dir, base_name)
-            self._save(filename, e_points)
-
-            # cemera projection
-            base_dir = os.path.join(self._save_dir, "laser_cp")
-            os.makedirs(base_dir, exist_ok=True)
-            filename = os.path.join(base_dir, base_name)
-            self._save(filename, cp_points)
+    def close(self) -> None:
+        super(LaserExtractor, self).close()
+        if self._laser_format == "files":
+            # the packed and range lasers record the selection in the header of every frame
+            self._save_meta()
+        if self._engine == "numpy" and self._laser_format != "range":
+            logger.info("Beam direction cache:\n" + create_small_table(self._cache.stats()))
         logger.info("Finish extracting laser")
@@ -0,0 +1,106 @@
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from waymo_toolkit.utils.logger import setup_logger
+
+logger = setup_logger("extractor")
+
+
+class Manifest:
+    """Record which segments have been fully extracted for which kinds of output.
+
+    The manifest is a json file in the save dir, rewritten atomically after every
+    change, so a crashed run leaves the interrupted segments marked as running.
+    """
+
+    def __init__(self, save_dir: str, filename: str = "manifest.json"):
+        self._path = os.path.join(save_dir, filename)
+        self._segments = {}
+        if os.path.isfile(self._path):
+            with open(self._path, "r") as fin:
+                self._segments = json.load(fin)["segments"]
+
+    @staticmethod
+    def _source(filename: str) -> Dict[str, int]:
+        stat = os.stat(filename)
+        return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "w") as fout:
+            json.dump({"segments": self._segments}, fout, indent=2, sort_keys=True)
+        os.replace(tmp_path, self._path)
+
+    def pending(
+        self,
+        filename: str,
+        kinds: Iterable[str],
+        subset: Optional[str] = None,
+        configs: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> List[str]:
+        """Return the kinds of output which are not completed for the segment.
+        The subset names the frames to extract, None for all of them, and the configs give
+        the options of each kind changing what is written, e.g. the format.
+        """
+        configs = configs or {}
+        segment = self._segments.get(os.path.basename(filename))
+        if segment is None:
+            return list(kinds)
+        if segment["source"] != self._source(filename):
+            logger.info("{} changed since the last extraction".format(filename))
+            return list(kinds)
+
+        pending = []
+        for kind in kinds:
+            output = segment["outputs"].get(kind)
+            if output is None or output["status"] != "complete":
+                if output is not None:
+                    logger.warning(
+                        "{} of {} was interrupted, extract it again".format(kind, filename)
+                    )
+                pending.append(kind)
+            elif output.get("subset") not in (None, subset):
+                # another subset of the frames was extracted
+                pending.append(kind)
+            elif output.get("config", {}) != configs.get(kind, {}):
+                # extracted with other options, e.g. another format of the lasers
+                pending.append(kind)
+        return pending
+
+    def start(self, tasks: Iterable[Tuple[str, Iterable[str]]]) -> None:
+        """Mark the kinds of output of the segments as running, given (filename, kinds) pairs.
+        """
+        for filename, kinds in tasks:
+            name = os.path.basename(filename)
+            source = self._source(filename)
+            segment = self._segments.get(name)
+            if segment is None or segment["source"] != source:
+                segment = {"source": source, "outputs": {}}
+                self._segments[name] = segment
+            for kind in kinds:
+                segment["outputs"][kind] = {"status": "running"}
+        self._save()
+
+    def finish(
+        self,
+        filename: str,
+        stats: Dict[str, Dict[str, int]],
+        subset: Optional[str] = None,
+        configs: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> None:
+        """Mark the kinds of output as completed with their stats, e.g. frames and bytes,
+        and the configs they were extracted with, see pending.
+        """
+        configs = configs or {}
+        segment = self._segments[os.path.basename(filename)]
+        for kind, stat in stats.items():
+            output = {"status": "complete"}
+            if subset is not None:
+                output["subset"] = subset
+            if kind in configs:
+                output["config"] = configs[kind]
+            output.update(stat)
+            segment["outputs"][kind] = output
+        self._save()
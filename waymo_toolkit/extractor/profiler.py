@@ -0,0 +1,117 @@
+import contextlib
+import json
+import os
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+from waymo_toolkit.utils.logger import create_small_table, setup_logger
+
+logger = setup_logger("extractor")
+
+
+class Profiler:
+    """Time the stages of the extraction, e.g. read, parse, image, laser and write.
+
+    The time of a stage excludes the stages nested in it, so the time spent writing
+    the files is not counted again in the extractor writing them. The per-frame latency
+    of a stage sums all its calls within the frame, ended by `end_frame`. The profilers
+    of several segments or workers are combined with `merge`.
+    """
+
+    def __init__(self):
+        self._seconds = Counter()
+        self._bytes_in = Counter()
+        self._bytes_out = Counter()
+        self._latencies = defaultdict(list)
+        self._gauges = defaultdict(list)
+        self._frame = Counter()
+        self._frames = 0
+        # [name, start, seconds of the nested stages]
+        self._stack = []
+
+    @property
+    def frames(self) -> int:
+        return self._frames
+
+    @contextlib.contextmanager
+    def stage(self, name: str, bytes_in: int = 0, bytes_out: int = 0) -> Iterator[None]:
+        entry = [name, time.perf_counter(), 0.0]
+        self._stack.append(entry)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - entry[1]
+            if len(self._stack) > 0:
+                self._stack[-1][2] += elapsed
+            self.add(name, elapsed - entry[2], bytes_in, bytes_out)
+
+    def add(self, name: str, seconds: float, bytes_in: int = 0, bytes_out: int = 0) -> None:
+        self._seconds[name] += seconds
+        self._frame[name] += seconds
+        self._bytes_in[name] += bytes_in
+        self._bytes_out[name] += bytes_out
+
+    def gauge(self, name: str, value: float) -> None:
+        """Sample a value, e.g. the depth of a queue, once per frame.
+        """
+        self._gauges[name].append(value)
+
+    def end_frame(self) -> None:
+        self._frames += 1
+        for name, seconds in self._frame.items():
+            self._latencies[name].append(seconds)
+        self._frame = Counter()
+
+    def merge(self, other: "Profiler") -> None:
+        self._seconds.update(other._seconds)
+        self._bytes_in.update(other._bytes_in)
+        self._bytes_out.update(other._bytes_out)
+        for name, values in other._latencies.items():
+            self._latencies[name].extend(values)
+        for name, values in other._gauges.items():
+            self._gauges[name].extend(values)
+        self._frames += other._frames
+
+    def summary(self, wall: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """Summarize every stage, and the whole run if the wall time is given.
+        """
+        summary = OrderedDict()
+        for name, seconds in self._seconds.items():
+            latencies = np.array(self._latencies[name]) * 1000
+            summary[name] = OrderedDict(
+                [
+                    ("seconds", seconds),
+                    ("frames/s", self._frames / seconds if seconds > 0 else 0.0),
+                    ("MB in", self._bytes_in[name] / (1 << 20)),
+                    ("MB out", self._bytes_out[name] / (1 << 20)),
+                    ("p50 ms", float(np.percentile(latencies, 50)) if len(latencies) else 0.0),
+                    ("p95 ms", float(np.percentile(latencies, 95)) if len(latencies) else 0.0),
+                ]
+            )
+        for name, values in self._gauges.items():
+            summary[name] = OrderedDict(
+                [("mean", float(np.mean(values))), ("max", float(np.max(values)))]
+            )
+        if wall is not None:
+            summary["total"] = OrderedDict(
+                [
+                    ("frames", self._frames),
+                    ("seconds", wall),
+                    ("frames/s", self._frames / wall if wall > 0 else 0.0),
+                ]
+            )
+        return summary
+
+    def log(self, wall: Optional[float] = None) -> None:
+        for name, values in self.summary(wall).items():
+            logger.info("Stage {}:\n".format(name) + create_small_table(values))
+
+    def dump(self, path: str, wall: Optional[float] = None) -> None:
+        tmp_path = "{}.{}".format(path, os.getpid())
+        with open(tmp_path, "w") as fout:
+            json.dump(self.summary(wall), fout, indent=2)
+        os.replace(tmp_path, path)
@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Tuple
+
+
+def _nbytes(data: Any) -> int:
+    return memoryview(data).nbytes
+
+
+class AsyncWriter:
+    """Write files on a thread pool, fed by an in-memory queue bounded by its bytes.
+
+    `write` blocks the caller while the queued bytes exceed `max_bytes`, so decoding
+    overlaps with the disk latency without buffering a whole segment in memory.
+    """
+
+    def __init__(self, num_threads: int = 4, max_bytes: int = 256 << 20):
+        assert num_threads > 0
+        self._executor = ThreadPoolExecutor(max_workers=num_threads)
+        self._max_bytes = max_bytes
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._pending_bytes = 0
+        self._errors = []
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def pending_bytes(self) -> int:
+        return self._pending_bytes
+
+    def write(self, path: str, data: Any) -> None:
+        """Queue `data`, any object supporting the buffer protocol, to be written to `path`.
+        The data must not be modified until it is written.
+        """
+        nbytes = _nbytes(data)
+        with self._cond:
+            # always accept one write, even if it is larger than the budget
+            while self._pending > 0 and self._pending_bytes + nbytes > self._max_bytes:
+                self._cond.wait()
+            self._pending += 1
+            self._pending_bytes += nbytes
+        self._executor.submit(self._write, path, data, nbytes)
+
+    def _write(self, path: str, data: Any, nbytes: int) -> None:
+        try:
+            with open(path, "wb") as fout:
+                fout.write(data)
+        except Exception as e:
+            with self._cond:
+                self._errors.append((path, e))
+        finally:
+            with self._cond:
+                self._pending -= 1
+                self._pending_bytes -= nbytes
+                self._cond.notify_all()
+
+    def flush(self) -> List[Tuple[str, Exception]]:
+        """Wait for all the queued writes, and return the (path, error) of the failed ones.
+        """
+        with self._cond:
+            while self._pending > 0:
+                self._cond.wait()
+            errors, self._errors = self._errors, []
+        return errors
+
+    def close(self) -> List[Tuple[str, Exception]]:
+        errors = self.flush()
+        self._executor.shutdown()
+        return errors
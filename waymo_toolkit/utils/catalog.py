@@ -0,0 +1,156 @@
+import os
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from waymo_toolkit.protos import dataset_pb2 as open_dataset
+from waymo_toolkit.protos import label_pb2
+
+from .proto_utils import parse_into
+from .tfrecord import TFRecordReader
+from .wire import frame_head
+
+# the object types counted in Context.stats.laser_object_counts
+OBJECT_TYPES = {
+    "vehicle": label_pb2.Label.TYPE_VEHICLE,
+    "pedestrian": label_pb2.Label.TYPE_PEDESTRIAN,
+    "sign": label_pb2.Label.TYPE_SIGN,
+    "cyclist": label_pb2.Label.TYPE_CYCLIST,
+}
+# one row per segment, the counts are the max number of objects of a type in one frame
+SEGMENT_DTYPE = np.dtype(
+    [
+        ("segment", "S96"),
+        ("name", "S64"),
+        ("time_of_day", "S16"),
+        ("location", "S32"),
+        ("weather", "S16"),
+        ("num_frames", "<i4"),
+        ("start", "<i8"),
+        ("end", "<i8"),
+    ]
+    + [(_, "<i4") for _ in OBJECT_TYPES]
+)
+# one row per frame, the segment is the row of its segment and record the index in it
+FRAME_DTYPE = np.dtype(
+    [("segment", "<i4"), ("record", "<i4"), ("timestamp", "<i8")]
+    + [(_, "<i4") for _ in OBJECT_TYPES]
+)
+
+
+def parse_object_counts(counts: str) -> Dict[str, int]:
+    """Parse a list like 'pedestrian=5,cyclist=1' to {type: count}.
+    """
+    parsed = {}
+    for item in counts.split(",") if counts else []:
+        object_type, count = item.split("=")
+        object_type = object_type.strip().lower()
+        if object_type not in OBJECT_TYPES:
+            raise ValueError("unknown object type {}".format(object_type))
+        parsed[object_type] = int(count)
+    return parsed
+
+
+def _frame_row(context: open_dataset.Context, segment: int, index: int, record: memoryview):
+    # the views of the record must not outlive this call, the reader is closed after
+    data, timestamp = frame_head(record)
+    parse_into(context, data)
+    counts = {_.type: _.count for _ in context.stats.laser_object_counts}
+    return (segment, index, timestamp) + tuple(counts.get(_, 0) for _ in OBJECT_TYPES.values())
+
+
+class Catalog:
+    """A table of the segments of a split, and of their frames, to choose the data by
+    the weather, time of day, location or number of objects before extracting it.
+
+    It is built from the contexts and the timestamps of the frames only, which are sliced
+    from the head of every record by wire.frame_head, so the images and the lasers are
+    never read.
+    """
+
+    def __init__(self, segments: np.ndarray, frames: np.ndarray):
+        self.segments = segments
+        self.frames = frames
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    @classmethod
+    def build(cls, files: Iterable[str]) -> "Catalog":
+        segments = []
+        frames = []
+        context = open_dataset.Context()
+        for i, filename in enumerate(files):
+            context.Clear()
+            with TFRecordReader(filename) as reader:
+                rows = [_frame_row(context, i, k, record) for k, record in enumerate(reader)]
+            rows = np.array(rows, dtype=FRAME_DTYPE)
+            frames.append(rows)
+            timestamps = rows["timestamp"]
+            start, end = (timestamps.min(), timestamps.max()) if len(rows) > 0 else (0, 0)
+            # the description of the segment is the same in all of its frames
+            segments.append(
+                (
+                    os.path.basename(filename),
+                    context.name,
+                    context.stats.time_of_day,
+                    context.stats.location,
+                    context.stats.weather,
+                    len(rows),
+                    start,
+                    end,
+                )
+                + tuple(rows[_].max(initial=0) for _ in OBJECT_TYPES)
+            )
+        segments = np.array(segments, dtype=SEGMENT_DTYPE)
+        frames = np.concatenate(frames) if len(frames) > 0 else np.empty(0, dtype=FRAME_DTYPE)
+        return cls(segments, frames)
+
+    @classmethod
+    def load(cls, path: str) -> "Catalog":
+        with np.load(path) as catalog:
+            return cls(catalog["segments"], catalog["frames"])
+
+    def save(self, path: str) -> None:
+        tmp_path = "{}.{}.npz".format(path, os.getpid())
+        np.savez(tmp_path, segments=self.segments, frames=self.frames)
+        os.replace(tmp_path, path)
+
+    def filter(
+        self,
+        time_of_day: Optional[Union[str, List[str]]] = None,
+        location: Optional[Union[str, List[str]]] = None,
+        weather: Optional[Union[str, List[str]]] = None,
+        min_objects: Optional[Dict[str, int]] = None,
+    ) -> "Catalog":
+        """Keep the frames of the segments matching the description, a value or a list of
+        values, and holding at least min_objects, e.g. {"pedestrian": 5}.
+        """
+        keep = np.ones(len(self.segments), dtype=bool)
+        for column, values in [
+            ("time_of_day", time_of_day),
+            ("location", location),
+            ("weather", weather),
+        ]:
+            if values is None:
+                continue
+            values = [values] if isinstance(values, str) else values
+            keep &= np.isin(self.segments[column], [_.encode("utf-8") for _ in values])
+
+        frames = self.frames[keep[self.frames["segment"]]]
+        for object_type, count in (min_objects or {}).items():
+            frames = frames[frames[object_type] >= count]
+
+        # the segments left are renumbered in order
+        selected = np.unique(frames["segment"])
+        renumber = np.full(len(self.segments), -1, dtype=np.int32)
+        renumber[selected] = np.arange(len(selected))
+        frames = frames.copy()
+        frames["segment"] = renumber[frames["segment"]]
+        return Catalog(self.segments[selected], frames)
+
+    def files(self, source_dir: str) -> List[str]:
+        return [os.path.join(source_dir, _.decode("utf-8")) for _ in self.segments["segment"]]
+
+    def timestamps(self) -> np.ndarray:
+        return np.sort(self.frames["timestamp"])
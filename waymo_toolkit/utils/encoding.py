@@ -0,0 +1,95 @@
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import lz4.frame as _lz4
+except ImportError:
+    # lz4 is optional, zlib is always there
+    _lz4 = None
+
+# encoding: the dtype of the stored values, None to store them as they are
+ENCODINGS = {
+    "raw": None,
+    # lossless for values in range, e.g. the camera projections
+    "int16": "<i2",
+    # about 3 significant digits
+    "float16": "<f2",
+    # fixed point with a resolution of FIXED_SCALE, e.g. the coordinates and the ranges
+    "fixed16": "<i2",
+    # linear between the min and the max of the array
+    "uint8": "|u1",
+    "uint16": "<u2",
+}
+FIXED_SCALE = 0.01
+COMPRESSIONS = [None, "zlib", "lz4"]
+
+
+def _check_range(values: np.ndarray, dtype: np.dtype, encoding: str) -> None:
+    info = np.iinfo(dtype)
+    if values.size > 0 and (values.min() < info.min or values.max() > info.max):
+        raise ValueError(
+            "the values in [{}, {}] overflow {}".format(values.min(), values.max(), encoding)
+        )
+
+
+def encode(array: np.ndarray, encoding: str) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Encode the array, return the stored values and the json serializable parameters
+    to decode them with decode.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError("unknown encoding {}".format(encoding))
+    if encoding == "raw":
+        return array, {}
+    dtype = np.dtype(ENCODINGS[encoding])
+    if encoding == "float16":
+        return array.astype(dtype), {}
+    if encoding == "int16":
+        _check_range(array, dtype, encoding)
+        return array.astype(dtype), {}
+    if encoding == "fixed16":
+        stored = np.round(array / FIXED_SCALE)
+        _check_range(stored, dtype, encoding)
+        return stored.astype(dtype), {"scale": FIXED_SCALE}
+    # uint8 and uint16 spread the levels between the min and the max
+    low = float(array.min()) if array.size > 0 else 0.0
+    high = float(array.max()) if array.size > 0 else 0.0
+    scale = (high - low) / np.iinfo(dtype).max or 1.0
+    stored = np.round((array - low) / scale)
+    return stored.astype(dtype), {"scale": scale, "offset": low}
+
+
+def decode(stored: np.ndarray, encoding: Dict[str, Any], dtype: np.dtype) -> np.ndarray:
+    """Decode the stored values of an encoding, as described by the header of a column,
+    e.g. {"name": "fixed16", "scale": 0.01}, to an array of dtype.
+    """
+    dtype = np.dtype(dtype)
+    if "scale" not in encoding:
+        return stored.astype(dtype)
+    values = stored.astype(dtype)
+    values *= dtype.type(encoding["scale"])
+    if encoding.get("offset", 0.0) != 0.0:
+        values += dtype.type(encoding["offset"])
+    return values
+
+
+def compress(data: Any, compression: str) -> bytes:
+    if compression == "zlib":
+        # the higher levels take twice as long for a few percent on the lasers
+        return zlib.compress(data, 1)
+    if compression == "lz4":
+        if _lz4 is None:
+            raise ImportError("the lz4 compression needs the lz4 package")
+        return _lz4.compress(data)
+    raise ValueError("unknown compression {}".format(compression))
+
+
+def decompress(data: Any, compression: Optional[str]) -> bytes:
+    if compression == "zlib":
+        return zlib.decompress(data)
+    if compression == "lz4":
+        if _lz4 is None:
+            raise ImportError("the lz4 compression needs the lz4 package")
+        return _lz4.decompress(data)
+    raise ValueError("unknown compression {}".format(compression))
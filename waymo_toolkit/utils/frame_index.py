@@ -0,0 +1,155 @@
+import os
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from waymo_toolkit.protos import dataset_pb2 as open_dataset
+
+from .catalog import OBJECT_TYPES
+from .label_io import CALIBRATION_DIR, load_annotation, load_calibration
+from .label_table import LABEL_TABLE_DIR, LabelTable, build_label_table
+
+FRAME_INDEX = "frame_index.npy"
+# the upper edges in meters of the bins of the distances of the laser boxes to the vehicle,
+# so the objects within any of them are counted with the histograms only
+DISTANCE_EDGES = (10.0, 20.0, 30.0, 40.0, 50.0, 75.0, np.inf)
+# one row per frame, the histograms are [type, bin] in the order of OBJECT_TYPES
+FRAME_INDEX_DTYPE = np.dtype(
+    [
+        ("timestamp", "<i8"),
+        ("segment", "<i4"),
+        ("time_of_day", "S16"),
+        ("location", "S32"),
+        ("weather", "S16"),
+        ("counts", "<i4", (len(OBJECT_TYPES),)),
+        ("camera_counts", "<i4", (len(OBJECT_TYPES),)),
+        ("distances", "<i4", (len(OBJECT_TYPES), len(DISTANCE_EDGES))),
+    ]
+)
+
+
+def _segment_stats(base_dir: str, name: str, timestamp: int) -> open_dataset.Context.Stats:
+    if os.path.isfile(os.path.join(base_dir, CALIBRATION_DIR, "{}.pb".format(name))):
+        return load_calibration(base_dir, name).stats
+    # extracted before the calibrations were saved, the labels carry the full context
+    return load_annotation(base_dir, str(timestamp)).context.stats
+
+
+def build_frame_index(base_dir: str) -> np.ndarray:
+    """Summarize every labelled frame of an extracted split in one row, from the label
+    table if there is one, otherwise from the labels.
+    """
+    if os.path.isdir(os.path.join(base_dir, LABEL_TABLE_DIR)):
+        table = LabelTable(base_dir)
+        labels, offsets, timestamps = table.labels, table.offsets, table.timestamps
+        segments = table.segments
+    else:
+        table = build_label_table(base_dir)
+        labels, offsets, timestamps = table["labels"], table["offsets"], table["timestamps"]
+        segments = table["segments"]
+
+    index = np.zeros(len(timestamps), dtype=FRAME_INDEX_DTYPE)
+    index["timestamp"] = timestamps
+    frames = np.repeat(np.arange(len(timestamps)), np.diff(offsets))
+    index["segment"] = -1
+    index["segment"][frames] = labels["segment"]
+    # the frames without any box are not in the table, their labels tell their segment
+    names = {name.decode("utf-8"): segment for segment, name in enumerate(segments)}
+    for i in np.flatnonzero(index["segment"] < 0):
+        name = load_annotation(base_dir, str(timestamps[i])).context.name
+        index["segment"][i] = names.setdefault(name, len(names))
+
+    # the description of the segments
+    for name, segment in names.items():
+        rows = np.flatnonzero(index["segment"] == segment)
+        if len(rows) == 0:
+            continue
+        stats = _segment_stats(base_dir, name, int(timestamps[rows[0]]))
+        index["time_of_day"][rows] = stats.time_of_day
+        index["location"][rows] = stats.location
+        index["weather"][rows] = stats.weather
+
+    laser = labels["camera"] == 0
+    distances = np.hypot(labels["center_x"], labels["center_y"])
+    bins = np.searchsorted(DISTANCE_EDGES, distances)
+    for t, object_type in enumerate(OBJECT_TYPES.values()):
+        selected = labels["type"] == object_type
+        np.add.at(index["counts"][:, t], frames[selected & laser], 1)
+        np.add.at(index["camera_counts"][:, t], frames[selected & ~laser], 1)
+        np.add.at(index["distances"][:, t], (frames[selected & laser], bins[selected & laser]), 1)
+    return index
+
+
+class FrameIndex:
+    """Query the frames of an extracted split by their objects and their description.
+
+    Every query is a few vectorized ops over the per-frame summaries in frame_index.npy,
+    built by build_frame_index, e.g. the frames with at least 5 pedestrians within 30 m
+    at night: `index.query(min_objects={"pedestrian": 5}, within=30, time_of_day="Night")`.
+    """
+
+    def __init__(self, base_dir: str):
+        self.frames = np.load(os.path.join(base_dir, FRAME_INDEX))
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def counts(self, within: Optional[float] = None) -> np.ndarray:
+        """Return the [F, T] laser objects of each type of the frames, all of them or
+        those within a distance, which must be one of DISTANCE_EDGES.
+        """
+        if within is None:
+            return self.frames["counts"]
+        if within not in DISTANCE_EDGES:
+            raise ValueError("the distance must be one of {}".format(DISTANCE_EDGES))
+        return self.frames["distances"][..., : DISTANCE_EDGES.index(within) + 1].sum(-1)
+
+    def query(
+        self,
+        min_objects: Optional[Dict[str, int]] = None,
+        max_objects: Optional[Dict[str, int]] = None,
+        within: Optional[float] = None,
+        time_of_day: Optional[Union[str, List[str]]] = None,
+        location: Optional[Union[str, List[str]]] = None,
+        weather: Optional[Union[str, List[str]]] = None,
+        camera: bool = False,
+    ) -> np.ndarray:
+        """Return the sorted timestamps of the frames matching all the conditions.
+        Args:
+            min_objects, max_objects: the least and the most objects of the types,
+                e.g. {"pedestrian": 5}.
+            within: if not None, only count the objects within this distance in meters.
+            time_of_day, location, weather: a value or a list of values.
+            camera: count the camera boxes instead of the laser ones, within is not
+                supported then.
+        """
+        keep = np.ones(len(self.frames), dtype=bool)
+        for column, values in [
+            ("time_of_day", time_of_day),
+            ("location", location),
+            ("weather", weather),
+        ]:
+            if values is None:
+                continue
+            values = [values] if isinstance(values, str) else values
+            keep &= np.isin(self.frames[column], [_.encode("utf-8") for _ in values])
+
+        if camera:
+            assert within is None, "the camera boxes have no distance"
+            counts = self.frames["camera_counts"]
+        else:
+            counts = self.counts(within)
+        types = list(OBJECT_TYPES.keys())
+        for object_type, count in (min_objects or {}).items():
+            keep &= counts[:, types.index(object_type)] >= count
+        for object_type, count in (max_objects or {}).items():
+            keep &= counts[:, types.index(object_type)] <= count
+        return np.sort(self.frames["timestamp"][keep])
+
+
+def save_frame_index(base_dir: str, index: np.ndarray) -> str:
+    path = os.path.join(base_dir, FRAME_INDEX)
+    tmp_path = "{}.{}.npy".format(path, os.getpid())
+    np.save(tmp_path, index)
+    os.replace(tmp_path, path)
+    return path
@@ -4,24 +4,74 @@ from waymo_open_dataset import dataset_pb2
 from waymo_open_dataset.utils import range_image_utils, transform_utils
 
 
+def _decompress_matrix(data: bytes, matrix_type):
+    matrix = matrix_type()
+    matrix.ParseFromString(bytearray(tf.io.decode_compressed(data, "ZLIB").numpy()))
+    return matrix
+
+
+def parse_range_image_and_camera_projection(frame, laser_names=None, ri_indexes=(0, 1)):
+    """Parse range images and camera projections given a frame, only the selected lasers
+        and returns are decompressed.
+    Args:
+        frame: open dataset frame
+        laser_names: the names of the lasers to parse, None for all of them.
+        ri_indexes: the returns to parse, 0 for the first and 1 for the second.
+    Returns:
+        range_images: A dict of {laser_name, [range_image_first_return,
+        range_image_second_return]}, the returns not parsed are None.
+        camera_projections: A dict of {laser_name,
+        [camera_projection_from_first_return,
+        camera_projection_from_second_return]}, the returns not parsed are None.
+        range_image_top_pose: range image pixel pose for top lidar, None if not parsed.
+    """
+    range_images = {}
+    camera_projections = {}
+    range_image_top_pose = None
+    for laser in frame.lasers:
+        if laser_names is not None and laser.name not in laser_names:
+            continue
+        range_images[laser.name] = [None, None]
+        camera_projections[laser.name] = [None, None]
+        for ri_index, ri in enumerate([laser.ri_return1, laser.ri_return2]):
+            if ri_index not in ri_indexes or len(ri.range_image_compressed) == 0:
+                continue
+            range_images[laser.name][ri_index] = _decompress_matrix(
+                ri.range_image_compressed, dataset_pb2.MatrixFloat
+            )
+            camera_projections[laser.name][ri_index] = _decompress_matrix(
+                ri.camera_projection_compressed, dataset_pb2.MatrixInt32
+            )
+        if laser.name == dataset_pb2.LaserName.TOP:
+            # the pixel pose is only stored with the first return
+            range_image_top_pose = _decompress_matrix(
+                laser.ri_return1.range_image_pose_compressed, dataset_pb2.MatrixFloat
+            )
+    return range_images, camera_projections, range_image_top_pose
+
+
 def convert_range_image_to_point_cloud(
-    frame, range_images, camera_projections, range_image_top_pose
+    frame, range_images, camera_projections, range_image_top_pose, ri_indexes=(0, 1)
 ):
     """Convert range images to point cloud.
     Args:
         frame: open dataset frame
         range_images: A dict of {laser_name, [range_image_first_return,
-        range_image_second_return]}.
+        range_image_second_return]}, only the lasers in it are converted.
         camera_projections: A dict of {laser_name,
         [camera_projection_from_first_return,
         camera_projection_from_second_return]}.
         range_image_top_pose: range image pixel pose for top lidar.
+        ri_indexes: the returns to convert, 0 for the first and 1 for the second.
     Returns:
         points: {[N, 3]} list of 3d lidar points of length 5 (number of lidars).
         cp_points: {[N, 6]} list of camera projections of length 5
         (number of lidars).
     """
-    calibrations = sorted(frame.context.laser_calibrations, key=lambda c: c.name)
+    calibrations = sorted(
+        [c for c in frame.context.laser_calibrations if c.name in range_images],
+        key=lambda c: c.name,
+    )
     points = []
     r_points = []
     i_points = []
@@ -29,24 +79,27 @@ def convert_range_image_to_point_cloud(
     cp_points = []
 
     frame_pose = tf.convert_to_tensor(value=np.reshape(np.array(frame.pose.transform), [4, 4]))
-    # [H, W, 6]
-    range_image_top_pose_tensor = tf.reshape(
-        tf.convert_to_tensor(value=range_image_top_pose.data), range_image_top_pose.shape.dims
-    )
-    # [H, W, 3, 3]
-    range_image_top_pose_tensor_rotation = transform_utils.get_rotation_matrix(
-        range_image_top_pose_tensor[..., 0],
-        range_image_top_pose_tensor[..., 1],
-        range_image_top_pose_tensor[..., 2],
-    )
-    range_image_top_pose_tensor_translation = range_image_top_pose_tensor[..., 3:]
-    range_image_top_pose_tensor = transform_utils.get_transform(
-        range_image_top_pose_tensor_rotation, range_image_top_pose_tensor_translation
-    )
+    if range_image_top_pose is not None:
+        # [H, W, 6]
+        range_image_top_pose_tensor = tf.reshape(
+            tf.convert_to_tensor(value=range_image_top_pose.data), range_image_top_pose.shape.dims
+        )
+        # [H, W, 3, 3]
+        range_image_top_pose_tensor_rotation = transform_utils.get_rotation_matrix(
+            range_image_top_pose_tensor[..., 0],
+            range_image_top_pose_tensor[..., 1],
+            range_image_top_pose_tensor[..., 2],
+        )
+        range_image_top_pose_tensor_translation = range_image_top_pose_tensor[..., 3:]
+        range_image_top_pose_tensor = transform_utils.get_transform(
+            range_image_top_pose_tensor_rotation, range_image_top_pose_tensor_translation
+        )
 
     for c in calibrations:
-        for ri_index in range(2):
+        for ri_index in ri_indexes:
             range_image = range_images[c.name][ri_index]
+            if range_image is None:
+                continue
             if len(c.beam_inclinations) == 0:  # pylint: disable=g-explicit-length-test
                 beam_inclinations = range_image_utils.compute_inclination(
                     tf.constant([c.beam_inclination_min, c.beam_inclination_max]),
@@ -0,0 +1,75 @@
+import functools
+import os
+
+import numpy as np
+
+from waymo_toolkit.protos import dataset_pb2 as open_dataset
+from waymo_toolkit.protos.annotation_pb2 import Annotation
+
+from .calibration import get_image_transform
+from .shard import read_record
+
+# one file per segment, {context name}.pb, with the calibrations and the stats of its context
+CALIBRATION_DIR = "calibration"
+
+# (base_dir, context name, camera): vehicle_to_image
+_TRANSFORMS = {}
+
+
+def segment_calibration(context: open_dataset.Context) -> open_dataset.Context:
+    """Return the part of a context shared by all the frames of its segment,
+    i.e. without the object counts of the frame.
+    """
+    calibration = open_dataset.Context()
+    calibration.CopyFrom(context)
+    calibration.stats.ClearField("laser_object_counts")
+    calibration.stats.ClearField("camera_object_counts")
+    return calibration
+
+
+def slim_context(context: open_dataset.Context) -> None:
+    """Drop the calibrations from the context of a label, they are in the segment file.
+    """
+    context.ClearField("camera_calibrations")
+    context.ClearField("laser_calibrations")
+
+
+def load_annotation(base_dir: str, name: str) -> Annotation:
+    anno = Annotation()
+    anno.ParseFromString(read_record(base_dir, "label", name, ".pb"))
+    return anno
+
+
+@functools.lru_cache(maxsize=64)
+def load_calibration(base_dir: str, context_name: str) -> open_dataset.Context:
+    """Load the calibrations of a segment, once per segment.
+    The context is shared by the callers, so it must not be modified.
+    """
+    path = os.path.join(base_dir, CALIBRATION_DIR, "{}.pb".format(context_name))
+    context = open_dataset.Context()
+    with open(path, "rb") as fin:
+        context.ParseFromString(fin.read())
+    return context
+
+
+def get_calibration(base_dir: str, anno: Annotation) -> open_dataset.Context:
+    """Return the context holding the calibrations of a label, its own one if it has the
+    calibrations, or the one of its segment for the slim labels.
+    """
+    if len(anno.context.camera_calibrations) > 0:
+        return anno.context
+    return load_calibration(base_dir, anno.context.name)
+
+
+def get_vehicle_to_image(base_dir: str, anno: Annotation, camera: int) -> np.ndarray:
+    """Return the [3, 4] transform from the vehicle frame to the image of the camera-th
+    calibration, computed once per segment. The matrix is shared, so it is read-only.
+    """
+    key = (base_dir, anno.context.name, camera)
+    vehicle_to_image = _TRANSFORMS.get(key)
+    if vehicle_to_image is None:
+        calibration = get_calibration(base_dir, anno).camera_calibrations[camera]
+        vehicle_to_image = get_image_transform(calibration)
+        vehicle_to_image.flags.writeable = False
+        _TRANSFORMS[key] = vehicle_to_image
+    return vehicle_to_image
@@ -0,0 +1,157 @@
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .label_io import load_annotation
+from .shard import list_records
+from .split import split_indices
+
+LABEL_TABLE_DIR = "label_table"
+# one row per box, the laser_labels have camera 0 and the camera_labels the name of their
+# camera, the segment and the id are rows of segments.npy and ids.npy
+LABEL_DTYPE = np.dtype(
+    [
+        ("timestamp", "<i8"),
+        ("segment", "<i4"),
+        ("camera", "u1"),
+        ("type", "u1"),
+        ("id", "<i4"),
+        ("center_x", "<f4"),
+        ("center_y", "<f4"),
+        ("center_z", "<f4"),
+        ("length", "<f4"),
+        ("width", "<f4"),
+        ("height", "<f4"),
+        ("heading", "<f4"),
+        ("speed_x", "<f4"),
+        ("speed_y", "<f4"),
+        ("accel_x", "<f4"),
+        ("accel_y", "<f4"),
+        ("num_lidar_points_in_box", "<i4"),
+        ("detection_difficulty_level", "u1"),
+        ("tracking_difficulty_level", "u1"),
+    ]
+)
+# the arrays of a table, each saved to {name}.npy
+_ARRAYS = ["labels", "offsets", "timestamps", "segments", "ids"]
+
+
+def _label_row(timestamp: int, segment: int, camera: int, object_id: int, label) -> tuple:
+    box, metadata = label.box, label.metadata
+    return (
+        timestamp,
+        segment,
+        camera,
+        label.type,
+        object_id,
+        box.center_x,
+        box.center_y,
+        box.center_z,
+        box.length,
+        box.width,
+        box.height,
+        box.heading,
+        metadata.speed_x,
+        metadata.speed_y,
+        metadata.accel_x,
+        metadata.accel_y,
+        label.num_lidar_points_in_box,
+        label.detection_difficulty_level,
+        label.tracking_difficulty_level,
+    )
+
+
+def build_label_table(base_dir: str) -> Dict[str, np.ndarray]:
+    """Gather the boxes of all the extracted labels of a split into one table.
+    Returns:
+        labels: [N] LABEL_DTYPE rows sorted by timestamp, the laser boxes of a frame first.
+        offsets: [F + 1] int64, the rows of the i-th frame are offsets[i]:offsets[i + 1].
+        timestamps: [F] int64 sorted timestamps of the frames.
+        segments, ids: the names of the segments and the ids of the objects.
+    """
+    timestamps = sorted(int(_) for _ in list_records(base_dir, "label", ".pb"))
+    segments = {}
+    ids = {}
+    rows = []
+    offsets = [0]
+    for timestamp in timestamps:
+        anno = load_annotation(base_dir, str(timestamp))
+        segment = segments.setdefault(anno.context.name, len(segments))
+        for label in anno.laser_labels:
+            object_id = ids.setdefault(label.id, len(ids))
+            rows.append(_label_row(timestamp, segment, 0, object_id, label))
+        for camera_labels in sorted(anno.camera_labels, key=lambda _: _.name):
+            for label in camera_labels.labels:
+                object_id = ids.setdefault(label.id, len(ids))
+                rows.append(_label_row(timestamp, segment, camera_labels.name, object_id, label))
+        offsets.append(len(rows))
+    return {
+        "labels": np.array(rows, dtype=LABEL_DTYPE),
+        "offsets": np.array(offsets, dtype=np.int64),
+        "timestamps": np.array(timestamps, dtype=np.int64),
+        "segments": np.array(list(segments.keys()), dtype=np.bytes_).reshape(-1),
+        "ids": np.array(list(ids.keys()), dtype=np.bytes_).reshape(-1),
+    }
+
+
+def save_label_table(base_dir: str, table: Dict[str, np.ndarray]) -> str:
+    table_dir = os.path.join(base_dir, LABEL_TABLE_DIR)
+    os.makedirs(table_dir, exist_ok=True)
+    for name in _ARRAYS:
+        path = os.path.join(table_dir, "{}.npy".format(name))
+        tmp_path = "{}.{}.npy".format(path, os.getpid())
+        np.save(tmp_path, table[name])
+        os.replace(tmp_path, path)
+    return table_dir
+
+
+class LabelTable:
+    """The boxes of all the frames of a split, memory mapped from the table saved by
+    tools/compact_labels.py, so no label is parsed to read them.
+
+    `table.labels` holds all the rows, and `table.frame(timestamp)` or `table[i]` the
+    rows of one frame, as views of the mapped table.
+    """
+
+    def __init__(self, base_dir: str):
+        table_dir = os.path.join(base_dir, LABEL_TABLE_DIR)
+        arrays = {}
+        for name in _ARRAYS:
+            arrays[name] = np.load(os.path.join(table_dir, "{}.npy".format(name)), mmap_mode="r")
+        self.labels = arrays["labels"]
+        self.offsets = np.asarray(arrays["offsets"])
+        self.timestamps = np.asarray(arrays["timestamps"])
+        self.segments = arrays["segments"]
+        self.ids = arrays["ids"]
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return self.labels[self.offsets[i] : self.offsets[i + 1]]
+
+    def index(self, timestamp: int) -> int:
+        i = int(np.searchsorted(self.timestamps, timestamp))
+        if i == len(self.timestamps) or self.timestamps[i] != timestamp:
+            raise KeyError("no labels for {}".format(timestamp))
+        return i
+
+    def indices(self, timestamps: np.ndarray) -> np.ndarray:
+        """Return the sorted indices of the frames of the timestamps, e.g. of a split.
+        """
+        return split_indices(self.timestamps, timestamps)
+
+    def frame(self, timestamp: int, camera: Optional[int] = None) -> np.ndarray:
+        """Return the rows of a frame, only the laser boxes with camera 0, or the boxes of
+        a camera given its name, all of them if camera is None.
+        """
+        rows = self[self.index(timestamp)]
+        if camera is None:
+            return rows
+        # the rows of a frame are sorted by camera
+        begin, end = np.searchsorted(rows["camera"], [camera, camera + 1])
+        return rows[begin:end]
+
+    def object_ids(self, rows: np.ndarray) -> List[str]:
+        return [_.decode("utf-8") for _ in self.ids[rows["id"]]]
@@ -0,0 +1,231 @@
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from waymo_toolkit.protos import dataset_pb2 as open_dataset
+
+from . import range_image_utils
+from .packed import load_packed, pack, unpack
+from .shard import is_sharded, list_records, open_shards, read_record
+from .split import load_split
+
+# column: (folder of the separate files, dtype, number of values per point)
+LASER_COLUMNS = OrderedDict(
+    [
+        ("xyz", ("laser", np.float32, 3)),
+        ("range", ("laser_r", np.float32, 1)),
+        ("intensity", ("laser_i", np.float32, 1)),
+        ("elongation", ("laser_e", np.float32, 1)),
+        ("cp", ("laser_cp", np.int32, 6)),
+    ]
+)
+# the encodings of the packed columns given by --laser-encoding=compact: 1 cm coordinates
+# and ranges, and the camera projections, whose values are below 2^15, as int16
+COMPACT_ENCODINGS = OrderedDict(
+    [
+        ("xyz", "fixed16"),
+        ("range", "fixed16"),
+        ("intensity", "uint16"),
+        ("elongation", "uint8"),
+        ("cp", "int16"),
+    ]
+)
+PACKED_DIR = "laser_packed"
+RANGE_DIR = "laser_range"
+# the beam directions of the lasers reconstructed by load_laser
+_CACHE = range_image_utils.BeamDirectionCache()
+
+
+def list_laser_frames(base_dir: str, split: str = "") -> List[str]:
+    """List the names (timestamps) of the extracted laser frames, in any format and layout,
+    or, if given, those of a split.txt in the order of their timestamps, without listing
+    the folders.
+    """
+    if split:
+        return [str(_) for _ in np.sort(load_split(split))]
+    for folder in [PACKED_DIR, RANGE_DIR, "laser"]:
+        names = list_records(base_dir, folder, ".bin")
+        if len(names) > 0:
+            return names
+    return []
+
+
+def parse_encodings(encodings: str) -> Dict[str, str]:
+    """Parse 'raw', 'compact' or a list like 'xyz=float16,cp=int16' to {column: encoding}.
+    """
+    if encodings == "raw":
+        return {}
+    if encodings == "compact":
+        return dict(COMPACT_ENCODINGS)
+    parsed = {}
+    for item in encodings.split(","):
+        column, encoding = (_.strip() for _ in item.split("="))
+        assert column in LASER_COLUMNS, "unknown laser column {}".format(column)
+        parsed[column] = encoding
+    return parsed
+
+
+def _load_packed_record(
+    base_dir: str, folder: str, name: str, columns: Optional[Iterable[str]]
+) -> Optional[Dict[str, np.ndarray]]:
+    """Load the columns of a packed record, None if the folder holds no records.
+    """
+    if is_sharded(base_dir):
+        if len(open_shards(base_dir).timestamps(folder)) > 0:
+            return unpack(read_record(base_dir, folder, name, ".bin"), columns)
+    else:
+        path = os.path.join(base_dir, folder, "{}.bin".format(name))
+        if os.path.isfile(path):
+            return load_packed(path, columns)
+    return None
+
+
+def _range_key(laser_name: int, ri_index: int) -> str:
+    return "{}_{}".format(open_dataset.LaserName.Name.Name(laser_name), ri_index + 1)
+
+
+def pack_range_images(
+    frame: open_dataset.Frame,
+    range_images: Dict[int, List[Optional[np.ndarray]]],
+    camera_projections: Dict[int, List[Optional[np.ndarray]]],
+    range_image_top_pose: Optional[np.ndarray],
+    meta: Optional[Dict[str, Any]] = None,
+    compression: str = "zlib",
+) -> bytearray:
+    """Pack the parsed range images of a frame, as given by
+    range_image_utils.parse_range_image_and_camera_projection, with the calibrations and
+    the pose needed to convert them. Every array is compressed, the range images are much
+    smaller than the points since the empty pixels compress to almost nothing.
+    """
+    head = open_dataset.Frame()
+    head.context.name = frame.context.name
+    head.context.laser_calibrations.extend(frame.context.laser_calibrations)
+    head.pose.CopyFrom(frame.pose)
+    head.timestamp_micros = frame.timestamp_micros
+    columns = OrderedDict([("frame", np.frombuffer(head.SerializeToString(), dtype=np.uint8))])
+    for laser_name in sorted(range_images.keys()):
+        for ri_index, range_image in enumerate(range_images[laser_name]):
+            if range_image is None:
+                continue
+            key = _range_key(laser_name, ri_index)
+            columns[key + "_ri"] = range_image
+            columns[key + "_cp"] = camera_projections[laser_name][ri_index]
+    if range_image_top_pose is not None:
+        columns["top_pose"] = range_image_top_pose
+    return pack(columns, meta, same_length=False, compression=compression)
+
+
+def load_range_images(
+    base_dir: str, name: str
+) -> Tuple[
+    open_dataset.Frame,
+    Dict[int, List[Optional[np.ndarray]]],
+    Dict[int, List[Optional[np.ndarray]]],
+    Optional[np.ndarray],
+]:
+    """Load the range images of a frame extracted with --laser-format=range.
+    Returns:
+        frame: the frame with only its name, laser calibrations, pose and timestamp.
+        range_images, camera_projections, range_image_top_pose: as given by
+        range_image_utils.parse_range_image_and_camera_projection.
+    """
+    arrays = _load_packed_record(base_dir, RANGE_DIR, name, None)
+    if arrays is None:
+        raise FileNotFoundError("no range images {} in {}".format(name, base_dir))
+    return _unpack_range_images(arrays)
+
+
+def _unpack_range_images(arrays: Dict[str, np.ndarray]):
+    frame = open_dataset.Frame()
+    frame.ParseFromString(arrays["frame"].tobytes())
+    range_images = {}
+    camera_projections = {}
+    for calibration in frame.context.laser_calibrations:
+        for ri_index in range(2):
+            key = _range_key(calibration.name, ri_index)
+            if key + "_ri" not in arrays:
+                continue
+            range_images.setdefault(calibration.name, [None, None])
+            camera_projections.setdefault(calibration.name, [None, None])
+            range_images[calibration.name][ri_index] = arrays[key + "_ri"]
+            camera_projections[calibration.name][ri_index] = arrays[key + "_cp"]
+    return frame, range_images, camera_projections, arrays.get("top_pose")
+
+
+def range_images_to_laser(
+    frame: open_dataset.Frame,
+    range_images: Dict[int, List[Optional[np.ndarray]]],
+    camera_projections: Dict[int, List[Optional[np.ndarray]]],
+    range_image_top_pose: Optional[np.ndarray],
+    columns: Iterable[str] = ("xyz",),
+    cache: Optional[range_image_utils.BeamDirectionCache] = None,
+) -> Dict[str, np.ndarray]:
+    """Get the columns of the points of the range images, the same points as
+    range_image_utils.convert_range_image_to_point_cloud. Only xyz needs the conversion,
+    the other columns are picked from the valid pixels.
+    Returns:
+        a dict of {column: [N, C] array}.
+    """
+    columns = list(columns)
+    ri_indexes = [0, 1]
+    if "xyz" in columns:
+        converted = range_image_utils.convert_range_image_to_point_cloud(
+            frame,
+            range_images,
+            camera_projections,
+            range_image_top_pose,
+            cache=_CACHE if cache is None else cache,
+            ri_indexes=ri_indexes,
+        )
+        arrays = dict(zip(LASER_COLUMNS.keys(), converted))
+    else:
+        # the order of convert_range_image_to_point_cloud, by laser and then by return
+        features = []
+        cps = []
+        for laser_name in sorted(range_images.keys()):
+            for ri_index in ri_indexes:
+                range_image = range_images[laser_name][ri_index]
+                if range_image is None:
+                    continue
+                mask = np.logical_and(range_image[..., 0] > 0, range_image[..., -1] != 1)
+                features.append(range_image[mask])
+                cps.append(camera_projections[laser_name][ri_index][mask])
+        features = np.concatenate(features, axis=0)
+        arrays = {
+            "range": features[:, 0],
+            "intensity": features[:, 1],
+            "elongation": features[:, 2],
+            "cp": np.concatenate(cps, axis=0),
+        }
+    return {k: arrays[k].reshape(len(arrays[k]), -1) for k in columns}
+
+
+def load_laser(
+    base_dir: str, name: str, columns: Iterable[str] = ("xyz",)
+) -> Dict[str, np.ndarray]:
+    """Load the columns of a laser frame, from the packed record if there is one, or
+    converted from the range images, otherwise from the separate ones, in the directories
+    or the shards.
+    Args:
+        base_dir: the extracted folder, e.g. /path/to/save_dir/training
+        name: the name (timestamp) of the frame.
+        columns: the columns to load, in LASER_COLUMNS.
+    Returns:
+        a dict of {column: [N, C] array}.
+    """
+    arrays = _load_packed_record(base_dir, PACKED_DIR, name, columns)
+    if arrays is not None:
+        return {k: v.reshape(len(v), -1) for k, v in arrays.items()}
+
+    arrays = _load_packed_record(base_dir, RANGE_DIR, name, None)
+    if arrays is not None:
+        return range_images_to_laser(*_unpack_range_images(arrays), columns=columns)
+
+    arrays = {}
+    for column in columns:
+        folder, dtype, width = LASER_COLUMNS[column]
+        data = read_record(base_dir, folder, name, ".bin")
+        arrays[column] = np.frombuffer(data, dtype=dtype).reshape(-1, width)
+    return arrays
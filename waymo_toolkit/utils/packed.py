@@ -0,0 +1,193 @@
+import json
+import struct
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+from .encoding import COMPRESSIONS, ENCODINGS, compress, decode, decompress, encode
+
+# magic, version and length of the json header
+_PREFIX = struct.Struct("<4sII")
+_MAGIC = b"WTPK"
+# version 2 adds the compressed and the encoded columns
+_VERSION = 2
+# the columns start at aligned offsets, so they can be memory mapped as they are
+_ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def pack(
+    columns: Dict[str, np.ndarray],
+    meta: Optional[Dict[str, Any]] = None,
+    same_length: bool = True,
+    compression: Optional[str] = None,
+    encodings: Optional[Dict[str, str]] = None,
+) -> bytearray:
+    """Pack the columns into one buffer, a small json header describing the count, names,
+    dtypes, shapes, encodings and offsets of the columns followed by the contiguous columns.
+    Args:
+        columns: the arrays to pack.
+        meta: extra json serializable information stored in the header.
+        same_length: whether all the columns must have the same length, the count.
+        compression: None to store the columns as they are, or "zlib" or "lz4" to compress
+            every column, which can not be memory mapped then.
+        encodings: {name: encoding} of the columns not stored as they are, see
+            waymo_toolkit.utils.encoding.ENCODINGS.
+    Returns:
+        the packed buffer.
+    """
+    assert compression in COMPRESSIONS
+    encodings = encodings or {}
+    counts = {len(v) for v in columns.values()}
+    assert len(counts) <= 1 or not same_length, "the columns should have the same length"
+
+    descs = []
+    arrays = []
+    offset = 0
+    for name, column in columns.items():
+        encoding = encodings.get(name, "raw")
+        array, params = encode(np.ascontiguousarray(column), encoding)
+        array = np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+        if compression is not None:
+            array = np.frombuffer(compress(array, compression), dtype=np.uint8)
+        desc = {
+            "name": name,
+            "dtype": column.dtype.str,
+            "shape": list(column.shape),
+            "offset": offset,
+            "nbytes": array.nbytes,
+        }
+        if encoding != "raw":
+            desc["encoding"] = dict(name=encoding, dtype=ENCODINGS[encoding], **params)
+        if compression is not None:
+            desc["compression"] = compression
+        descs.append(desc)
+        arrays.append(array)
+        offset = _align(offset + array.nbytes)
+    count = counts.pop() if len(counts) == 1 else 0
+    header = {"count": count, "columns": descs, "meta": meta or {}}
+    header = json.dumps(header).encode("utf-8")
+
+    # the offsets in the header are relative to the data start
+    start = _align(_PREFIX.size + len(header))
+    buf = bytearray(start + offset)
+    buf[: _PREFIX.size] = _PREFIX.pack(_MAGIC, _VERSION, len(header))
+    buf[_PREFIX.size : _PREFIX.size + len(header)] = header
+    data = np.frombuffer(buf, dtype=np.uint8)
+    for desc, array in zip(descs, arrays):
+        begin = start + desc["offset"]
+        data[begin : begin + array.nbytes] = array
+    return buf
+
+
+def _parse_header(prefix: bytes, read, path: str) -> Dict[str, Any]:
+    magic, version, length = _PREFIX.unpack(prefix)
+    if magic != _MAGIC:
+        raise ValueError("{} is not a packed file".format(path))
+    if version > _VERSION:
+        raise ValueError("{} has an unsupported version {}".format(path, version))
+    header = json.loads(read(length).decode("utf-8"))
+    start = _align(_PREFIX.size + length)
+    for desc in header["columns"]:
+        desc["offset"] += start
+    return header
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    """Read the header of a packed file, with the absolute offsets of the columns.
+    """
+    with open(path, "rb") as fin:
+        return _parse_header(fin.read(_PREFIX.size), fin.read, path)
+
+
+def _stored_dtype(desc: Dict[str, Any]) -> np.dtype:
+    return np.dtype(desc["encoding"]["dtype"] if "encoding" in desc else desc["dtype"])
+
+
+def _decode(desc: Dict[str, Any], stored: np.ndarray) -> np.ndarray:
+    if "encoding" not in desc:
+        return stored
+    return decode(stored, desc["encoding"], desc["dtype"])
+
+
+def _decompress(desc: Dict[str, Any], data: Any) -> np.ndarray:
+    # the columns are compressed one by one, see pack, and they own their memory, so they
+    # are writable unlike the views of the uncompressed ones
+    data = bytearray(decompress(data, desc["compression"]))
+    return np.frombuffer(data, dtype=_stored_dtype(desc)).reshape(desc["shape"])
+
+
+def unpack(buffer: Any, columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+    """Get the columns of a packed buffer, as views of it without copying,
+    unless they are compressed or encoded.
+    Args:
+        buffer: a packed buffer, any object supporting the buffer protocol.
+        columns: the names of the columns to get, None for all of them.
+    Returns:
+        a dict of {name: array}.
+    """
+    view = memoryview(buffer).cast("B")
+    header = _parse_header(
+        view[: _PREFIX.size], lambda n: bytes(view[_PREFIX.size : _PREFIX.size + n]), "buffer"
+    )
+    descs = OrderedDict((desc["name"], desc) for desc in header["columns"])
+    names = list(descs.keys()) if columns is None else list(columns)
+
+    arrays = OrderedDict()
+    for name in names:
+        if name not in descs:
+            raise KeyError("the buffer has no column {}".format(name))
+        desc = descs[name]
+        if "compression" in desc:
+            begin = desc["offset"]
+            stored = _decompress(desc, view[begin : begin + desc["nbytes"]])
+        else:
+            stored = np.frombuffer(
+                view,
+                dtype=_stored_dtype(desc),
+                count=int(np.prod(desc["shape"])),
+                offset=desc["offset"],
+            ).reshape(desc["shape"])
+        arrays[name] = _decode(desc, stored)
+    return arrays
+
+
+def load_packed(
+    path: str, columns: Optional[Iterable[str]] = None, mmap: bool = True
+) -> Dict[str, np.ndarray]:
+    """Load the columns of a packed file.
+    Args:
+        path: the packed file.
+        columns: the names of the columns to load, None for all of them.
+        mmap: whether to memory map the columns instead of reading them.
+    Returns:
+        a dict of {name: array}.
+    """
+    header = read_header(path)
+    descs = OrderedDict((desc["name"], desc) for desc in header["columns"])
+    names = list(descs.keys()) if columns is None else list(columns)
+
+    arrays = OrderedDict()
+    with open(path, "rb") as fin:
+        for name in names:
+            if name not in descs:
+                raise KeyError("{} has no column {}".format(path, name))
+            desc = descs[name]
+            dtype = _stored_dtype(desc)
+            shape = tuple(desc["shape"])
+            if "compression" in desc:
+                fin.seek(desc["offset"])
+                stored = _decompress(desc, fin.read(desc["nbytes"]))
+            elif desc["nbytes"] == 0:
+                stored = np.zeros(shape, dtype=dtype)
+            elif mmap:
+                stored = np.memmap(fin, dtype=dtype, mode="r", offset=desc["offset"], shape=shape)
+            else:
+                fin.seek(desc["offset"])
+                stored = np.frombuffer(fin.read(desc["nbytes"]), dtype=dtype).reshape(shape)
+            arrays[name] = _decode(desc, stored)
+    return arrays
@@ -0,0 +1,97 @@
+import math
+
+import numba
+import numpy as np
+from numba import boolean, float32, float64, int64
+
+
+@numba.jit(
+    int64(
+        float32[:, :],
+        boolean[:, :],
+        float32[:],
+        float32[:],
+        float64[:, :],
+        float32[:, :, :],
+        float64[:, :],
+        float32[:, :],
+    ),
+    nopython=True,
+)
+def extract_top_point_cloud(
+    range_image, mask, inclination, azimuth, extrinsic, pixel_pose, frame_pose, out
+):
+    """Compute the points of the valid pixels with per-pixel pose compensation, fusing the
+    polar to cartesian conversion, the extrinsic, the pixel pose and the world to vehicle
+    transforms, so no [H, W, 4, 4] temporaries are allocated.
+    Args:
+        range_image: [H, W] ranges.
+        mask: [H, W] valid pixels.
+        inclination: [H] inclinations of the rows.
+        azimuth: [W] azimuths of the columns.
+        extrinsic: [4, 4] lidar extrinsic.
+        pixel_pose: [H, W, 6] the (roll, pitch, yaw, x, y, z) pose of each pixel.
+        frame_pose: [4, 4] the vehicle pose of the frame.
+        out: [N, 3] the points of the valid pixels, N should be the number of them.
+    Returns:
+        the number of points written.
+    """
+    height, width = range_image.shape
+    ext = extrinsic
+    cos_azimuth = np.cos(azimuth.astype(np.float64))
+    sin_azimuth = np.sin(azimuth.astype(np.float64))
+    # the frame pose is rigid, so its inverse is [R^T, -R^T t]
+    world_to_vehicle = np.zeros((3, 4), dtype=np.float64)
+    for r in range(3):
+        for c in range(3):
+            world_to_vehicle[r, c] = frame_pose[c, r]
+        for c in range(3):
+            world_to_vehicle[r, 3] -= frame_pose[c, r] * frame_pose[c, 3]
+
+    n = 0
+    for i in range(height):
+        cos_incl = math.cos(inclination[i])
+        sin_incl = math.sin(inclination[i])
+        for j in range(width):
+            if not mask[i, j]:
+                continue
+            rng = np.float64(range_image[i, j])
+            sx = cos_azimuth[j] * cos_incl * rng
+            sy = sin_azimuth[j] * cos_incl * rng
+            sz = sin_incl * rng
+
+            # sensor to vehicle
+            vx = ext[0, 0] * sx + ext[0, 1] * sy + ext[0, 2] * sz + ext[0, 3]
+            vy = ext[1, 0] * sx + ext[1, 1] * sy + ext[1, 2] * sz + ext[1, 3]
+            vz = ext[2, 0] * sx + ext[2, 1] * sy + ext[2, 2] * sz + ext[2, 3]
+
+            # vehicle at the pixel time to world, rotation = yaw * pitch * roll
+            cos_roll = math.cos(pixel_pose[i, j, 0])
+            sin_roll = math.sin(pixel_pose[i, j, 0])
+            cos_pitch = math.cos(pixel_pose[i, j, 1])
+            sin_pitch = math.sin(pixel_pose[i, j, 1])
+            cos_yaw = math.cos(pixel_pose[i, j, 2])
+            sin_yaw = math.sin(pixel_pose[i, j, 2])
+            r00 = cos_yaw * cos_pitch
+            r01 = cos_yaw * sin_pitch * sin_roll - sin_yaw * cos_roll
+            r02 = cos_yaw * sin_pitch * cos_roll + sin_yaw * sin_roll
+            r10 = sin_yaw * cos_pitch
+            r11 = sin_yaw * sin_pitch * sin_roll + cos_yaw * cos_roll
+            r12 = sin_yaw * sin_pitch * cos_roll - cos_yaw * sin_roll
+            r20 = -sin_pitch
+            r21 = cos_pitch * sin_roll
+            r22 = cos_pitch * cos_roll
+            wx = r00 * vx + r01 * vy + r02 * vz + pixel_pose[i, j, 3]
+            wy = r10 * vx + r11 * vy + r12 * vz + pixel_pose[i, j, 4]
+            wz = r20 * vx + r21 * vy + r22 * vz + pixel_pose[i, j, 5]
+
+            # world to vehicle at the frame time
+            for k in range(3):
+                out[n, k] = (
+                    world_to_vehicle[k, 0] * wx
+                    + world_to_vehicle[k, 1] * wy
+                    + world_to_vehicle[k, 2] * wz
+                    + world_to_vehicle[k, 3]
+                )
+            n += 1
+    return n
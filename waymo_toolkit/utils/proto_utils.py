@@ -0,0 +1,52 @@
+from typing import Iterable, Union
+
+from google.protobuf.internal import api_implementation
+from google.protobuf.message import Message
+
+from .wire import slice_runs
+
+# the implementations of protobuf, from the fastest, chosen by
+# PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION before protobuf is imported
+BACKENDS = ["upb", "cpp", "python"]
+# the runs of the fields parsed by parse_fields are joined below this size, one parse of a
+# small copy is faster than several merges, the larger ones are merged without a copy
+JOIN_BYTES = 1 << 16
+
+
+def protobuf_backend() -> str:
+    return api_implementation.Type()
+
+
+def parse_into(message: Message, data: Union[bytes, memoryview]) -> Message:
+    """Parse a record into a reused message, from the bytes or the view of the record,
+    without copying it first. The old fields are cleared, so the submessages taken from
+    the message before must not be used after.
+    """
+    message.Clear()
+    _merge(message, data)
+    return message
+
+
+def parse_fields(
+    message: Message, data: Union[bytes, memoryview], fields: Iterable[int]
+) -> Message:
+    """Parse only the top-level fields of a record into a reused message, the others are
+    skipped by their length, see wire.slice_runs. The fields are merged from views of the
+    record, unless they are split in several small runs, which are joined first.
+    """
+    runs = slice_runs(data, fields)
+    message.Clear()
+    if len(runs) > 1 and sum(len(_) for _ in runs) < JOIN_BYTES:
+        runs = [b"".join(runs)]
+    # the fields are top-level, so merging the runs one after another parses them all
+    for run in runs:
+        _merge(message, run)
+    return message
+
+
+def _merge(message: Message, data: Union[bytes, memoryview]) -> None:
+    try:
+        message.MergeFromString(data)
+    except TypeError:
+        # the older cpp implementation only parses bytes
+        message.MergeFromString(bytes(data))
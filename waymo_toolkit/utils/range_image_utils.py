@@ -0,0 +1,333 @@
+import functools
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from waymo_toolkit.protos import dataset_pb2
+
+
+@functools.lru_cache(maxsize=1)
+def _top_point_cloud_kernel():
+    # numba takes a while to import and compile the kernel, so only pay for it on first use
+    try:
+        from .pixel_pose import extract_top_point_cloud
+    except ImportError:
+        # numba is not installed, fall back to the vectorized numpy version
+        extract_top_point_cloud = None
+    return extract_top_point_cloud
+
+
+def _decompress_matrix(data: bytes, matrix_type) -> np.ndarray:
+    matrix = matrix_type()
+    matrix.ParseFromString(zlib.decompress(data))
+    dtype = np.float32 if matrix_type is dataset_pb2.MatrixFloat else np.int32
+    return np.array(matrix.data, dtype=dtype).reshape(matrix.shape.dims)
+
+
+def parse_range_image_and_camera_projection(
+    frame, laser_names: Optional[Sequence[int]] = None, ri_indexes: Sequence[int] = (0, 1)
+) -> Tuple[Dict[int, List[np.ndarray]], Dict[int, List[np.ndarray]], Optional[np.ndarray]]:
+    """Parse range images and camera projections of a frame into numpy arrays,
+        the same as waymo_toolkit.utils.frame_utils but without tensorflow.
+    Args:
+        frame: open dataset frame
+        laser_names: the names of the lasers to parse, None for all of them.
+        ri_indexes: the returns to parse, 0 for the first and 1 for the second.
+    Returns:
+        range_images: A dict of {laser_name, [range_image_first_return,
+        range_image_second_return]}, each of them is a [H, W, 4] float32 array,
+        or None if not parsed.
+        camera_projections: A dict of {laser_name,
+        [camera_projection_from_first_return,
+        camera_projection_from_second_return]}, each of them is a [H, W, 6] int32 array,
+        or None if not parsed.
+        range_image_top_pose: [H, W, 6] float32 range image pixel pose for top lidar.
+    """
+    range_images = {}
+    camera_projections = {}
+    range_image_top_pose = None
+    for laser in frame.lasers:
+        if laser_names is not None and laser.name not in laser_names:
+            continue
+        range_images[laser.name] = [None, None]
+        camera_projections[laser.name] = [None, None]
+        for ri_index, ri in enumerate([laser.ri_return1, laser.ri_return2]):
+            if ri_index not in ri_indexes or len(ri.range_image_compressed) == 0:
+                continue
+            range_images[laser.name][ri_index] = _decompress_matrix(
+                ri.range_image_compressed, dataset_pb2.MatrixFloat
+            )
+            camera_projections[laser.name][ri_index] = _decompress_matrix(
+                ri.camera_projection_compressed, dataset_pb2.MatrixInt32
+            )
+        if laser.name == dataset_pb2.LaserName.TOP:
+            # the pixel pose is only stored with the first return
+            range_image_top_pose = _decompress_matrix(
+                laser.ri_return1.range_image_pose_compressed, dataset_pb2.MatrixFloat
+            )
+    return range_images, camera_projections, range_image_top_pose
+
+
+def compute_inclination(inclination_range: np.ndarray, height: int) -> np.ndarray:
+    """Compute uniform inclinations of the rows given the [min, max] inclination.
+    """
+    diff = inclination_range[1] - inclination_range[0]
+    ratios = (0.5 + np.arange(height, dtype=inclination_range.dtype)) / height
+    return ratios * diff + inclination_range[0]
+
+
+def get_beam_inclinations(calibration, height: int) -> np.ndarray:
+    """Return the [H] float32 inclinations of the rows, the 0-th entry for the 0-th row.
+    """
+    if len(calibration.beam_inclinations) == 0:
+        inclination_range = np.array(
+            [calibration.beam_inclination_min, calibration.beam_inclination_max], dtype=np.float32
+        )
+        beam_inclinations = compute_inclination(inclination_range, height)
+    else:
+        beam_inclinations = np.array(calibration.beam_inclinations, dtype=np.float32)
+    return beam_inclinations[::-1]
+
+
+def compute_azimuth(extrinsic: np.ndarray, width: int) -> np.ndarray:
+    """Return the [W] float32 azimuths of the columns in the sensor frame.
+    """
+    az_correction = np.arctan2(extrinsic[1, 0], extrinsic[0, 0])
+    ratios = (np.arange(width, 0, -1, dtype=np.float64) - 0.5) / width
+    azimuth = (ratios * 2.0 - 1.0) * np.pi - az_correction
+    return azimuth.astype(np.float32)
+
+
+def compute_range_image_directions(
+    inclination: np.ndarray, azimuth: np.ndarray, mask: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Compute the unit directions of the range image pixels in the sensor frame.
+    Args:
+        inclination: [H] inclinations of the rows.
+        azimuth: [W] azimuths of the columns.
+        mask: [H, W] if given, only compute the directions of the valid pixels.
+    Returns:
+        directions: [H, W, 3] float64 directions, or [N, 3] if mask is given.
+    """
+    inclination = inclination.astype(np.float64)
+    azimuth = azimuth.astype(np.float64)
+    if mask is None:
+        inclination, azimuth = np.meshgrid(inclination, azimuth, indexing="ij")
+    else:
+        rows, cols = np.nonzero(mask)
+        inclination, azimuth = inclination[rows], azimuth[cols]
+    cos_incl = np.cos(inclination)
+    return np.stack(
+        [np.cos(azimuth) * cos_incl, np.sin(azimuth) * cos_incl, np.sin(inclination)], axis=-1
+    )
+
+
+def get_rotation_matrix(roll: np.ndarray, pitch: np.ndarray, yaw: np.ndarray) -> np.ndarray:
+    """Get the [..., 3, 3] rotation matrices given euler angles, as R = yaw * pitch * roll.
+    """
+    cos_roll, sin_roll = np.cos(roll), np.sin(roll)
+    cos_pitch, sin_pitch = np.cos(pitch), np.sin(pitch)
+    cos_yaw, sin_yaw = np.cos(yaw), np.sin(yaw)
+
+    rotation = np.empty(roll.shape + (3, 3), dtype=roll.dtype)
+    rotation[..., 0, 0] = cos_yaw * cos_pitch
+    rotation[..., 0, 1] = cos_yaw * sin_pitch * sin_roll - sin_yaw * cos_roll
+    rotation[..., 0, 2] = cos_yaw * sin_pitch * cos_roll + sin_yaw * sin_roll
+    rotation[..., 1, 0] = sin_yaw * cos_pitch
+    rotation[..., 1, 1] = sin_yaw * sin_pitch * sin_roll + cos_yaw * cos_roll
+    rotation[..., 1, 2] = sin_yaw * sin_pitch * cos_roll - cos_yaw * sin_roll
+    rotation[..., 2, 0] = -sin_pitch
+    rotation[..., 2, 1] = cos_pitch * sin_roll
+    rotation[..., 2, 2] = cos_pitch * cos_roll
+    return rotation
+
+
+class BeamDirectionCache:
+    """Cache the per-pixel unit directions of the lidar beams, which only depend on the
+    calibration and the width of the range image, so they are the same in a segment.
+
+    The entries are keyed by (context name, laser name, height, width) and the least
+    recently used one is dropped when there are more than `max_size` entries.
+    """
+
+    def __init__(self, max_size: int = 16):
+        assert max_size > 0
+        self._max_size = max_size
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get(
+        self, context_name: str, calibration, height: int, width: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the [H, W, 3] float64 directions in the sensor and in the vehicle frame.
+        """
+        key = (context_name, calibration.name, height, width)
+        directions = self._cache.get(key)
+        if directions is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return directions
+
+        self.misses += 1
+        extrinsic = np.reshape(np.array(calibration.extrinsic.transform), [4, 4])
+        inclination = get_beam_inclinations(calibration, height)
+        azimuth = compute_azimuth(extrinsic, width)
+        sensor = compute_range_image_directions(inclination, azimuth)
+        vehicle = sensor @ extrinsic[:3, :3].T
+        directions = (sensor, vehicle)
+        self._cache[key] = directions
+        if len(self._cache) > self._max_size:
+            self._cache.popitem(last=False)
+        return directions
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+def extract_point_cloud_from_range_image(
+    range_image: np.ndarray,
+    extrinsic: np.ndarray,
+    inclination: np.ndarray,
+    mask: np.ndarray,
+    pixel_pose: Optional[np.ndarray] = None,
+    frame_pose: Optional[np.ndarray] = None,
+    directions: Optional[np.ndarray] = None,
+    kernel: bool = True,
+) -> np.ndarray:
+    """Extract the point cloud of the valid pixels in the vehicle frame.
+    Args:
+        range_image: [H, W] ranges.
+        extrinsic: [4, 4] lidar extrinsic.
+        inclination: [H] inclinations of the rows.
+        mask: [H, W] valid pixels.
+        pixel_pose: [H, W, 6] if not None, the (roll, pitch, yaw, x, y, z) pose of each pixel.
+        frame_pose: [4, 4] must be set when pixel_pose is set, the vehicle pose of the frame.
+        directions: [H, W, 3] if not None, the precomputed directions in the vehicle frame,
+            then inclination is not used unless pixel_pose is set.
+        kernel: use the numba kernel for the pixel poses if numba is installed, False
+            always takes the vectorized numpy path.
+    Returns:
+        points: [N, 3] float32 points of the valid pixels.
+    """
+    kernel = _top_point_cloud_kernel() if kernel and pixel_pose is not None else None
+    if kernel is not None:
+        if frame_pose is None:
+            raise ValueError("frame_pose must be set when pixel_pose is set.")
+        points = np.empty((np.count_nonzero(mask), 3), dtype=np.float32)
+        kernel(
+            range_image,
+            mask,
+            inclination,
+            compute_azimuth(extrinsic, range_image.shape[1]),
+            extrinsic,
+            pixel_pose,
+            frame_pose,
+            points,
+        )
+        return points
+
+    if directions is None:
+        azimuth = compute_azimuth(extrinsic, range_image.shape[1])
+        directions = compute_range_image_directions(inclination, azimuth, mask)
+        directions = directions @ extrinsic[:3, :3].T
+    else:
+        directions = directions[mask]
+    points = range_image[mask].astype(np.float64)[:, np.newaxis] * directions + extrinsic[:3, 3]
+
+    if pixel_pose is not None:
+        if frame_pose is None:
+            raise ValueError("frame_pose must be set when pixel_pose is set.")
+        pose = pixel_pose[mask].astype(np.float64)
+        rotation = get_rotation_matrix(pose[:, 0], pose[:, 1], pose[:, 2])
+        points = np.einsum("nij,nj->ni", rotation, points) + pose[:, 3:]
+        world_to_vehicle = np.linalg.inv(frame_pose)
+        points = points @ world_to_vehicle[:3, :3].T + world_to_vehicle[:3, 3]
+    return points.astype(np.float32)
+
+
+def convert_range_image_to_point_cloud(
+    frame,
+    range_images: Dict[int, List[np.ndarray]],
+    camera_projections: Dict[int, List[np.ndarray]],
+    range_image_top_pose: Optional[np.ndarray],
+    cache: Optional[BeamDirectionCache] = None,
+    ri_indexes: Sequence[int] = (0, 1),
+):
+    """Convert range images to point cloud with numpy, the same output as
+        waymo_toolkit.utils.frame_utils.convert_range_image_to_point_cloud.
+    Args:
+        frame: open dataset frame
+        range_images: A dict of {laser_name, [range_image_first_return,
+        range_image_second_return]}, only the lasers in it are converted.
+        camera_projections: A dict of {laser_name,
+        [camera_projection_from_first_return,
+        camera_projection_from_second_return]}.
+        range_image_top_pose: range image pixel pose for top lidar.
+        cache: if not None, reuse the beam directions of the lasers in the same segment.
+        ri_indexes: the returns to convert, 0 for the first and 1 for the second.
+    Returns:
+        points: [N, 3] 3d lidar points of all the lidars.
+        r_points, i_points, e_points: [N] range, intensity and elongation of the points.
+        cp_points: [N, 6] camera projections of the points.
+    """
+    calibrations = sorted(
+        [c for c in frame.context.laser_calibrations if c.name in range_images],
+        key=lambda c: c.name,
+    )
+    points = []
+    r_points = []
+    i_points = []
+    e_points = []
+    cp_points = []
+
+    frame_pose = np.reshape(np.array(frame.pose.transform), [4, 4])
+
+    for c in calibrations:
+        extrinsic = np.reshape(np.array(c.extrinsic.transform), [4, 4])
+        for ri_index in ri_indexes:
+            range_image = range_images[c.name][ri_index]
+            if range_image is None:
+                continue
+            height, width = range_image.shape[:2]
+            pixel_pose = None
+            if c.name == dataset_pb2.LaserName.TOP:
+                pixel_pose = range_image_top_pose
+
+            directions = None
+            if cache is not None:
+                directions = cache.get(frame.context.name, c, height, width)[1]
+            # the top lidar kernel computes the directions from the inclinations by itself
+            beam_inclinations = None
+            if directions is None or pixel_pose is not None:
+                beam_inclinations = get_beam_inclinations(c, height)
+            range_image_mask = np.logical_and(range_image[..., 0] > 0, range_image[..., -1] != 1)
+            range_image_cartesian = extract_point_cloud_from_range_image(
+                range_image[..., 0],
+                extrinsic,
+                beam_inclinations,
+                range_image_mask,
+                pixel_pose=pixel_pose,
+                frame_pose=frame_pose,
+                directions=directions,
+            )
+            range_image_features = range_image[range_image_mask]
+
+            cp = camera_projections[c.name][ri_index]
+
+            points.append(range_image_cartesian)
+            r_points.append(range_image_features[..., 0])
+            i_points.append(range_image_features[..., 1])
+            e_points.append(range_image_features[..., 2])
+            cp_points.append(cp[range_image_mask])
+    points = np.concatenate(points, axis=0)
+    r_points = np.concatenate(r_points, axis=0)
+    i_points = np.concatenate(i_points, axis=0)
+    e_points = np.concatenate(e_points, axis=0)
+    cp_points = np.concatenate(cp_points, axis=0)
+    return points, r_points, i_points, e_points, cp_points
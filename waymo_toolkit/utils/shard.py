@@ -0,0 +1,175 @@
+import functools
+import glob
+import os
+from typing import Any, List, Tuple
+
+import numpy as np
+
+SHARD_DIR = "shards"
+# one entry per record of a shard, the kind is the folder of the default layout
+INDEX_DTYPE = np.dtype(
+    [("timestamp", "<i8"), ("kind", "S16"), ("offset", "<u8"), ("length", "<u8")]
+)
+
+
+class ShardWriter:
+    """Append the records to fixed-size shards instead of writing one file per record.
+
+    Every shard is an append-only blob `{prefix}-{i:05d}.bin` with an index `.idx` mapping
+    (timestamp, kind) to the offset and length of the record. It takes the same paths as
+    AsyncWriter, `{save_dir}/{kind}/{timestamp}.{ext}`, so the extractors need no change.
+    """
+
+    def __init__(self, save_dir: str, prefix: str, shard_size: int = 1 << 30):
+        self._shard_dir = os.path.join(save_dir, SHARD_DIR)
+        os.makedirs(self._shard_dir, exist_ok=True)
+        self._prefix = prefix
+        self._shard_size = shard_size
+        self._shard = -1
+        self._fout = None
+        self._offset = 0
+        self._entries = []
+
+    @property
+    def pending(self) -> int:
+        return 0
+
+    @property
+    def pending_bytes(self) -> int:
+        return 0
+
+    def _shard_path(self, ext: str) -> str:
+        return os.path.join(self._shard_dir, "{}-{:05d}{}".format(self._prefix, self._shard, ext))
+
+    def _save_index(self) -> None:
+        path = self._shard_path(".idx")
+        tmp_path = "{}.{}".format(path, os.getpid())
+        with open(tmp_path, "wb") as fout:
+            np.save(fout, np.array(self._entries, dtype=INDEX_DTYPE))
+        os.replace(tmp_path, path)
+
+    def _roll(self) -> None:
+        if self._fout is not None:
+            self._fout.close()
+            self._save_index()
+        self._shard += 1
+        self._fout = open(self._shard_path(".bin"), "wb")
+        self._offset = 0
+        self._entries = []
+
+    def write(self, path: str, data: Any) -> None:
+        """Append `data`, any object supporting the buffer protocol, as the record of `path`.
+        """
+        nbytes = memoryview(data).nbytes
+        if self._fout is None or (self._offset > 0 and self._offset + nbytes > self._shard_size):
+            self._roll()
+        kind = os.path.basename(os.path.dirname(path))
+        timestamp = int(os.path.splitext(os.path.basename(path))[0])
+        self._fout.write(data)
+        self._entries.append((timestamp, kind.encode("utf-8"), self._offset, nbytes))
+        self._offset += nbytes
+
+    def flush(self) -> List[Tuple[str, Exception]]:
+        # the index always describes what is written to the blob so far
+        if self._fout is not None:
+            self._fout.flush()
+            self._save_index()
+        return []
+
+    def close(self) -> List[Tuple[str, Exception]]:
+        errors = self.flush()
+        if self._fout is not None:
+            self._fout.close()
+            self._fout = None
+        return errors
+
+
+class ShardReader:
+    """Random access to the records of the shards in `base_dir`, one pread per record.
+
+    The indexes are merged into arrays sorted by (kind, timestamp). If a record is found
+    in several shards, e.g. a segment extracted again, the most recent shard wins.
+    """
+
+    def __init__(self, base_dir: str):
+        shard_dir = os.path.join(base_dir, SHARD_DIR)
+        paths = sorted(glob.glob(os.path.join(shard_dir, "*.idx")), key=os.path.getmtime)
+        self._paths = [_.replace(".idx", ".bin") for _ in paths]
+        self._fds = {}
+
+        indexes = [np.load(_) for _ in paths] or [np.zeros(0, dtype=INDEX_DTYPE)]
+        index = np.concatenate(indexes)
+        shards = np.concatenate([np.full(len(_), i, dtype=np.int32) for i, _ in enumerate(indexes)])
+
+        kind_names, kinds = np.unique(index["kind"], return_inverse=True)
+        order = np.lexsort((np.arange(len(index)), index["timestamp"], kinds))
+        kinds, index, shards = kinds[order], index[order], shards[order]
+        # keep the last entry of each (kind, timestamp)
+        last = np.ones(len(index), dtype=bool)
+        last[:-1] = (kinds[1:] != kinds[:-1]) | (index["timestamp"][1:] != index["timestamp"][:-1])
+        kinds, index, shards = kinds[last], index[last], shards[last]
+
+        self._timestamps = index["timestamp"]
+        self._offsets = index["offset"]
+        self._lengths = index["length"]
+        self._shards = shards
+        self._kinds = {}
+        for i, name in enumerate(kind_names):
+            begin, end = np.searchsorted(kinds, [i, i + 1])
+            self._kinds[name.decode("utf-8")] = (begin, end)
+
+    @property
+    def kinds(self) -> List[str]:
+        return sorted(self._kinds.keys())
+
+    def timestamps(self, kind: str) -> np.ndarray:
+        begin, end = self._kinds.get(kind, (0, 0))
+        return self._timestamps[begin:end]
+
+    def _fd(self, shard: int) -> int:
+        if shard not in self._fds:
+            self._fds[shard] = os.open(self._paths[shard], os.O_RDONLY)
+        return self._fds[shard]
+
+    def read(self, timestamp: int, kind: str) -> bytes:
+        begin, end = self._kinds.get(kind, (0, 0))
+        i = begin + np.searchsorted(self._timestamps[begin:end], timestamp)
+        if i == end or self._timestamps[i] != timestamp:
+            raise KeyError("no {} record for {}".format(kind, timestamp))
+        length, offset = int(self._lengths[i]), int(self._offsets[i])
+        return os.pread(self._fd(int(self._shards[i])), length, offset)
+
+    def close(self) -> None:
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds = {}
+
+
+@functools.lru_cache(maxsize=8)
+def open_shards(base_dir: str) -> ShardReader:
+    return ShardReader(base_dir)
+
+
+def is_sharded(base_dir: str) -> bool:
+    return os.path.isdir(os.path.join(base_dir, SHARD_DIR))
+
+
+def list_records(base_dir: str, kind: str, ext: str) -> List[str]:
+    """List the names (timestamps) of the records of a kind, in either layout.
+    """
+    if is_sharded(base_dir):
+        return [str(_) for _ in open_shards(base_dir).timestamps(kind)]
+    record_dir = os.path.join(base_dir, kind)
+    if not os.path.isdir(record_dir):
+        return []
+    return [_[: -len(ext)] for _ in os.listdir(record_dir) if _.endswith(ext)]
+
+
+def read_record(base_dir: str, kind: str, name: str, ext: str) -> bytes:
+    """Read the record of a kind, from the shards if there are some,
+    otherwise from `{base_dir}/{kind}/{name}{ext}`.
+    """
+    if is_sharded(base_dir):
+        return open_shards(base_dir).read(int(name), kind)
+    with open(os.path.join(base_dir, kind, "{}{}".format(name, ext)), "rb") as fin:
+        return fin.read()
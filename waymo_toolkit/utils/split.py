@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+
+from .tfrecord import TFRecordReader
+from .wire import frame_timestamp
+
+
+def select_subset(timestamps: np.ndarray, percentage: float, seed: int) -> np.ndarray:
+    """Randomly select the percentage of the timestamps.
+    The timestamps are sorted first, so the same frames give the same subset for a seed
+    wherever they come from, the extracted labels or the tfrecords.
+    """
+    timestamps = np.sort(np.asarray(timestamps, dtype=np.int64))
+    total = len(timestamps)
+    np.random.seed(seed)
+    index = np.random.choice(total, int(percentage * total), replace=False)
+    return timestamps[index]
+
+
+def _binary_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".npy"
+
+
+def save_split(path: str, timestamps: np.ndarray) -> None:
+    """Save the timestamps as integers to a text file, e.g. split.txt, and as int64 to the
+    .npy next to it, e.g. split.npy, which load_split reads first.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    np.savetxt(path, timestamps, fmt="%d")
+    binary_path = _binary_path(path)
+    if binary_path != path:
+        tmp_path = "{}.{}.npy".format(binary_path, os.getpid())
+        np.save(tmp_path, timestamps)
+        os.replace(tmp_path, binary_path)
+
+
+def load_split(path: str) -> np.ndarray:
+    """Load the int64 timestamps of a split, from its .npy if there is one, otherwise
+    from the text, which the older splits hold as floats like 1.557...e+15.
+    """
+    binary_path = _binary_path(path)
+    if os.path.isfile(binary_path):
+        # the text may be edited by hand, so the binary must not be older
+        if not os.path.isfile(path) or os.path.getmtime(binary_path) >= os.path.getmtime(path):
+            return np.load(binary_path).astype(np.int64, copy=False)
+    values = np.loadtxt(path, dtype=str, ndmin=1)
+    if any("e" in _ or "." in _ for _ in values):
+        # the 16 digits are below 2 ** 53, so the floats hold them exactly
+        return values.astype(np.float64).astype(np.int64)
+    return values.astype(np.int64)
+
+
+def split_indices(timestamps: np.ndarray, selected: np.ndarray) -> np.ndarray:
+    """Return the sorted indices in the timestamps of the frames of a split, with a
+    binary search of the sorted timestamps, e.g. the rows of a label table.
+    Raise KeyError if a frame of the split is not in the timestamps.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    selected = np.asarray(selected, dtype=np.int64)
+    order = np.argsort(timestamps, kind="stable")
+    sorted_timestamps = timestamps[order]
+    index = np.searchsorted(sorted_timestamps, selected)
+    found = index < len(sorted_timestamps)
+    found[found] = sorted_timestamps[index[found]] == selected[found]
+    if not found.all():
+        raise KeyError("{} frames of the split are missing".format((~found).sum()))
+    return np.sort(order[index])
+
+
+def segment_timestamps(path: str) -> np.ndarray:
+    """Return the timestamps of the frames of a segment in the order of its records.
+    Only the head of every record is read from the mapped file.
+    """
+    with TFRecordReader(path) as reader:
+        return np.array([frame_timestamp(record) for record in reader], dtype=np.int64)
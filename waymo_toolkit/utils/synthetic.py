@@ -0,0 +1,260 @@
+import zlib
+
+import numpy as np
+
+from waymo_toolkit.protos import dataset_pb2 as open_dataset
+from waymo_toolkit.protos import label_pb2
+
+from .tfrecord import write_tfrecord
+
+# the resolutions of the released data
+LASER_SHAPES = {
+    open_dataset.LaserName.TOP: (64, 2650),
+    open_dataset.LaserName.FRONT: (200, 600),
+    open_dataset.LaserName.SIDE_LEFT: (200, 600),
+    open_dataset.LaserName.SIDE_RIGHT: (200, 600),
+    open_dataset.LaserName.REAR: (200, 600),
+}
+# laser: (x, y, z, yaw) of the mounting
+LASER_MOUNTS = {
+    open_dataset.LaserName.TOP: (1.43, 0.0, 2.18, 0.0),
+    open_dataset.LaserName.FRONT: (4.07, 0.0, 0.69, 0.0),
+    open_dataset.LaserName.SIDE_LEFT: (3.25, 1.03, 0.98, np.pi / 2),
+    open_dataset.LaserName.SIDE_RIGHT: (3.25, -1.03, 0.98, -np.pi / 2),
+    open_dataset.LaserName.REAR: (-1.15, 0.0, 0.46, np.pi),
+}
+# camera: (height, width, yaw)
+CAMERA_SHAPES = {
+    open_dataset.CameraName.FRONT: (1280, 1920, 0.0),
+    open_dataset.CameraName.FRONT_LEFT: (1280, 1920, np.pi / 4),
+    open_dataset.CameraName.FRONT_RIGHT: (1280, 1920, -np.pi / 4),
+    open_dataset.CameraName.SIDE_LEFT: (886, 1920, np.pi / 2),
+    open_dataset.CameraName.SIDE_RIGHT: (886, 1920, -np.pi / 2),
+}
+# type: (length, width, height) of the boxes
+BOX_SIZES = {
+    label_pb2.Label.TYPE_VEHICLE: (4.5, 2.0, 1.6),
+    label_pb2.Label.TYPE_PEDESTRIAN: (0.8, 0.8, 1.8),
+    label_pb2.Label.TYPE_SIGN: (0.3, 0.6, 0.8),
+    label_pb2.Label.TYPE_CYCLIST: (1.8, 0.8, 1.7),
+}
+MAX_RANGE = 75.0
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _varints(values: np.ndarray) -> bytes:
+    """Encode int32 values as protobuf varints, negative ones take 10 bytes."""
+    values = values.astype(np.int64).view(np.uint64)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += values >= np.uint64(1 << (7 * k))
+    starts = np.cumsum(nbytes) - nbytes
+    out = np.zeros(int(nbytes.sum()), dtype=np.uint8)
+    for k in range(10):
+        selected = nbytes > k
+        if not selected.any():
+            break
+        byte = (values[selected] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (nbytes[selected] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[selected] + k] = (byte | more).astype(np.uint8)
+    return out.tobytes()
+
+
+def encode_matrix(array: np.ndarray) -> bytes:
+    """Serialize a float32 array as a MatrixFloat, or an int32 one as a MatrixInt32,
+    without going through the repeated fields, which is slow for millions of values.
+    """
+    if array.dtype == np.float32:
+        data = array.astype("<f4").tobytes()
+    else:
+        assert array.dtype == np.int32
+        data = _varints(array.ravel())
+    shape = b"".join(b"\x08" + _varint(_) for _ in array.shape)
+    return b"\x0a" + _varint(len(data)) + data + b"\x12" + _varint(len(shape)) + shape
+
+
+def _transform(x: float, y: float, z: float, yaw: float) -> np.ndarray:
+    transform = np.eye(4)
+    transform[:3, :3] = [[np.cos(yaw), -np.sin(yaw), 0], [np.sin(yaw), np.cos(yaw), 0], [0, 0, 1]]
+    transform[:3, 3] = [x, y, z]
+    return transform
+
+
+def _inclinations(name: int, height: int) -> np.ndarray:
+    if name == open_dataset.LaserName.TOP:
+        return np.linspace(-0.31, 0.04, height)
+    return np.linspace(-1.57, 0.52, height)
+
+
+def make_context(name: str, rng: np.random.RandomState) -> open_dataset.Context:
+    """Build the calibrations of a segment, the stats are filled by make_frame.
+    """
+    context = open_dataset.Context()
+    context.name = name
+    for camera, (height, width, yaw) in CAMERA_SHAPES.items():
+        calibration = context.camera_calibrations.add()
+        calibration.name = camera
+        focal = 2055.0 + rng.normal(0, 5)
+        calibration.intrinsic.extend([focal, focal, width / 2, height / 2, 0, 0, 0, 0, 0])
+        extrinsic = _transform(1.5, 0.0, 2.1, yaw)
+        calibration.extrinsic.transform.extend(extrinsic.ravel().tolist())
+        calibration.width = width
+        calibration.height = height
+    for laser, (x, y, z, yaw) in LASER_MOUNTS.items():
+        calibration = context.laser_calibrations.add()
+        calibration.name = laser
+        height = LASER_SHAPES[laser][0]
+        inclinations = _inclinations(laser, height)
+        # only the top laser comes with non-uniform inclinations
+        if laser == open_dataset.LaserName.TOP:
+            calibration.beam_inclinations.extend(inclinations.tolist())
+        calibration.beam_inclination_min = inclinations[0]
+        calibration.beam_inclination_max = inclinations[-1]
+        calibration.extrinsic.transform.extend(_transform(x, y, z, yaw).ravel().tolist())
+    context.stats.time_of_day = rng.choice(["Day", "Night", "Dawn/Dusk"])
+    context.stats.location = rng.choice(["location_sf", "location_phx", "location_other"])
+    context.stats.weather = rng.choice(["sunny", "rain"])
+    return context
+
+
+def _range_image(name: int, rng: np.random.RandomState, first: bool) -> np.ndarray:
+    """[H, W, 4] range, intensity, elongation and no label zone, the rows looking down
+    hit the ground and the others hit obstacles or nothing.
+    """
+    height, width = LASER_SHAPES[name]
+    mount_z = LASER_MOUNTS[name][2]
+    inclination = _inclinations(name, height)[::-1, np.newaxis]
+    ranges = np.where(
+        inclination < -0.01,
+        mount_z / np.sin(-np.minimum(inclination, -0.01)),
+        rng.uniform(5, MAX_RANGE, (height, width)),
+    )
+    ranges = ranges + rng.normal(0, 0.02, (height, width))
+    valid = (ranges < MAX_RANGE) & (rng.uniform(size=(height, width)) < (0.9 if first else 0.1))
+    range_image = np.empty((height, width, 4), dtype=np.float32)
+    range_image[..., 0] = np.where(valid, ranges, -1)
+    range_image[..., 1] = np.where(valid, rng.exponential(0.1, (height, width)), -1)
+    range_image[..., 2] = np.where(valid, rng.uniform(0, 0.5, (height, width)), -1)
+    range_image[..., 3] = -1
+    return range_image
+
+
+def _camera_projection(name: int, rng: np.random.RandomState) -> np.ndarray:
+    height, width = LASER_SHAPES[name]
+    projection = np.zeros((height, width, 6), dtype=np.int32)
+    visible = rng.uniform(size=(height, width)) < 0.4
+    projection[..., 0] = np.where(visible, rng.randint(1, 6, (height, width)), 0)
+    projection[..., 1] = np.where(visible, rng.randint(0, 1920, (height, width)), 0)
+    projection[..., 2] = np.where(visible, rng.randint(0, 1280, (height, width)), 0)
+    return projection
+
+
+def _image(height: int, width: int, rng: np.random.RandomState) -> bytes:
+    import cv2
+
+    # a smooth gradient with some noise compresses about as well as a real street
+    y, x = np.mgrid[0:height, 0:width]
+    image = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], -1)
+    image = image + rng.normal(0, 8, image.shape)
+    return cv2.imencode(".jpg", np.clip(image, 0, 255).astype(np.uint8))[1].tobytes()
+
+
+def _labels(frame: open_dataset.Frame, rng: np.random.RandomState, num_objects: int) -> None:
+    counts = {}
+    for i in range(num_objects):
+        label = frame.laser_labels.add()
+        label.type = rng.choice(list(BOX_SIZES.keys()))
+        length, width, height = BOX_SIZES[label.type]
+        distance, angle = rng.uniform(3, 60), rng.uniform(-np.pi, np.pi)
+        label.box.center_x = distance * np.cos(angle)
+        label.box.center_y = distance * np.sin(angle)
+        label.box.center_z = height / 2
+        label.box.length = length * rng.uniform(0.9, 1.1)
+        label.box.width = width * rng.uniform(0.9, 1.1)
+        label.box.height = height * rng.uniform(0.9, 1.1)
+        label.box.heading = rng.uniform(-np.pi, np.pi)
+        label.metadata.speed_x = rng.normal(0, 2)
+        label.metadata.speed_y = rng.normal(0, 2)
+        label.id = "object-{}".format(i)
+        label.num_lidar_points_in_box = rng.randint(1, 2000)
+        counts[label.type] = counts.get(label.type, 0) + 1
+
+    for camera, (height, width, _) in CAMERA_SHAPES.items():
+        camera_labels = frame.camera_labels.add()
+        camera_labels.name = camera
+        for i in range(rng.randint(0, num_objects // 2 + 1)):
+            label = camera_labels.labels.add()
+            label.type = rng.choice(list(BOX_SIZES.keys()))
+            label.box.length = rng.uniform(20, 400)
+            label.box.width = rng.uniform(20, 300)
+            label.box.center_x = rng.uniform(label.box.length / 2, width - label.box.length / 2)
+            label.box.center_y = rng.uniform(label.box.width / 2, height - label.box.width / 2)
+            label.id = "object-{}-{}".format(camera, i)
+        frame.projected_lidar_labels.add().CopyFrom(camera_labels)
+
+    for label_type, count in sorted(counts.items()):
+        object_count = frame.context.stats.laser_object_counts.add()
+        object_count.type = label_type
+        object_count.count = count
+
+
+def make_frame(
+    context: open_dataset.Context,
+    index: int,
+    rng: np.random.RandomState,
+    images: bool = True,
+    num_objects: int = 30,
+) -> open_dataset.Frame:
+    """Build the index-th frame of a segment, driving along x at 10 m/s and 10 Hz.
+    """
+    frame = open_dataset.Frame()
+    frame.context.CopyFrom(context)
+    # the segments of different names start at different times
+    start = 1550000000000000 + zlib.crc32(context.name.encode("utf-8")) * 1000
+    frame.timestamp_micros = start + index * 100000
+    pose = _transform(index * 1.0, 0.0, 0.0, 0.0)
+    frame.pose.transform.extend(pose.ravel().tolist())
+
+    if images:
+        for camera, (height, width, _) in CAMERA_SHAPES.items():
+            image = frame.images.add()
+            image.name = camera
+            image.image = _image(height, width, rng)
+            image.pose.transform.extend(pose.ravel().tolist())
+
+    for name in LASER_SHAPES.keys():
+        laser = frame.lasers.add()
+        laser.name = name
+        for first, ri in [(True, laser.ri_return1), (False, laser.ri_return2)]:
+            range_image = _range_image(name, rng, first)
+            ri.range_image_compressed = zlib.compress(encode_matrix(range_image))
+            projection = _camera_projection(name, rng)
+            ri.camera_projection_compressed = zlib.compress(encode_matrix(projection))
+            if name == open_dataset.LaserName.TOP and first:
+                # the vehicle moves by up to 10 cm during a spin
+                height, width = LASER_SHAPES[name]
+                pixel_pose = np.zeros((height, width, 6), dtype=np.float32)
+                pixel_pose[..., 3] = pose[0, 3] + np.linspace(-0.1, 0, width)
+                ri.range_image_pose_compressed = zlib.compress(encode_matrix(pixel_pose))
+
+    _labels(frame, rng, num_objects)
+    return frame
+
+
+def make_segment(
+    path: str, name: str, num_frames: int = 20, seed: int = 0, images: bool = True
+) -> None:
+    """Write a synthetic segment of num_frames frames to the tfrecord path.
+    """
+    rng = np.random.RandomState(seed)
+    context = make_context(name, rng)
+    records = (make_frame(context, i, rng, images).SerializeToString() for i in range(num_frames))
+    write_tfrecord(path, records)
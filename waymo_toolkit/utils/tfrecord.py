@@ -0,0 +1,211 @@
+import functools
+import mmap
+import os
+import struct
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+try:
+    from crc32c import crc32c as _crc32c
+except ImportError:
+    # the crc32c package is not installed, fall back to the numpy version
+    _crc32c = None
+
+# every record is: uint64 length, uint32 masked crc of length, data, uint32 masked crc of data
+_LENGTH = struct.Struct("<Q")
+_CRC = struct.Struct("<I")
+_HEADER_SIZE = _LENGTH.size + _CRC.size
+_FOOTER_SIZE = _CRC.size
+_MASK_DELTA = 0xA282EAD8
+
+
+def _make_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_TABLE = _make_table()
+_NP_TABLE = np.array(_TABLE, dtype=np.uint32)
+# the bytes of the chunks updated together by the numpy version
+_CHUNK = 4096
+
+
+def _update(crc: int, data: bytes) -> int:
+    for byte in data:
+        crc = _TABLE[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc
+
+
+@functools.lru_cache(maxsize=1)
+def _shift_tables():
+    """Tables applying _CHUNK zero bytes to a crc, one per byte of the crc.
+    The update is linear, so the image of any crc xors the images of its bits.
+    """
+    zeros = bytes(_CHUNK)
+    bits = [_update(1 << i, zeros) for i in range(32)]
+    tables = []
+    for k in range(4):
+        table = []
+        for b in range(256):
+            crc = 0
+            for i in range(8):
+                if b >> i & 1:
+                    crc ^= bits[8 * k + i]
+            table.append(crc)
+        tables.append(table)
+    return tables
+
+
+def crc32c(data: bytes) -> int:
+    if _crc32c is not None:
+        return _crc32c(data)
+    data = memoryview(data).cast("B")
+    num_chunks = len(data) // _CHUNK
+    crc = 0xFFFFFFFF
+    if num_chunks > 1:
+        # update the crc of every chunk from zero side by side, then chain them
+        chunks = np.frombuffer(data, dtype=np.uint8, count=num_chunks * _CHUNK)
+        chunks = chunks.reshape(num_chunks, _CHUNK).astype(np.uint32)
+        crcs = np.zeros(num_chunks, dtype=np.uint32)
+        for j in range(_CHUNK):
+            crcs = _NP_TABLE[(crcs ^ chunks[:, j]) & 0xFF] ^ (crcs >> 8)
+        t0, t1, t2, t3 = _shift_tables()
+        for chunk_crc in crcs.tolist():
+            crc = t0[crc & 0xFF] ^ t1[crc >> 8 & 0xFF] ^ t2[crc >> 16 & 0xFF] ^ t3[crc >> 24]
+            crc ^= chunk_crc
+        data = data[num_chunks * _CHUNK :]
+    return _update(crc, data) ^ 0xFFFFFFFF
+
+
+def masked_crc32c(data: bytes) -> int:
+    crc = crc32c(data)
+    return (((crc >> 15) | (crc << 17)) + _MASK_DELTA) & 0xFFFFFFFF
+
+
+class TFRecordReader:
+    """Read the records of a TFRecord file without tensorflow.
+
+    The file is memory mapped, and the offsets of the records are indexed once and saved
+    to `index_path` (default `{path}.index`), so frame k of a segment is read in O(1)
+    and a segment can be split across workers with `records(start, stop)`.
+    The records are memoryviews of the mapped file, valid until the reader is closed.
+    """
+
+    def __init__(self, path: str, check_crc: bool = False, index_path: Optional[str] = None):
+        self._path = path
+        self._check_crc = check_crc
+        self._index_path = path + ".index" if index_path is None else index_path
+        self._file = open(path, "rb")
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._mmap = None
+        self._view = memoryview(b"")
+        if self._size > 0:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+        self._index = self._load_index()
+
+    def _load_index(self) -> np.ndarray:
+        """Load the [N, 2] (offset, length) of the records, building it if missing or stale.
+        """
+        if os.path.isfile(self._index_path):
+            try:
+                index = np.load(self._index_path)
+            except (OSError, ValueError):
+                # a truncated or corrupt index is built again
+                index = None
+            # the index is stale unless the last record ends with the file
+            if index is not None and index.ndim == 2 and index.shape[1] == 2 and len(index) > 0:
+                if int(index[-1, 0] + index[-1, 1]) + _FOOTER_SIZE == self._size:
+                    return index
+        index = self._build_index()
+        try:
+            tmp_path = "{}.{}".format(self._index_path, os.getpid())
+            with open(tmp_path, "wb") as fout:
+                np.save(fout, index)
+            os.replace(tmp_path, self._index_path)
+        except OSError:
+            # e.g. a read-only dataset, index it again next time
+            pass
+        return index
+
+    def _build_index(self) -> np.ndarray:
+        offsets = []
+        pos = 0
+        while pos < self._size:
+            if pos + _HEADER_SIZE > self._size:
+                raise IOError("{} is truncated at {}".format(self._path, pos))
+            header = self._view[pos : pos + _HEADER_SIZE]
+            (length,) = _LENGTH.unpack_from(header)
+            if self._check_crc:
+                (crc,) = _CRC.unpack_from(header, _LENGTH.size)
+                if masked_crc32c(header[: _LENGTH.size]) != crc:
+                    raise IOError("{} has a corrupted length at {}".format(self._path, pos))
+            begin = pos + _HEADER_SIZE
+            pos = begin + length + _FOOTER_SIZE
+            if pos > self._size:
+                raise IOError("{} is truncated at {}".format(self._path, begin))
+            offsets.append((begin, length))
+        return np.array(offsets, dtype=np.int64).reshape(-1, 2)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __getitem__(self, k: int) -> memoryview:
+        offset, length = (int(_) for _ in self._index[k])
+        data = self._view[offset : offset + length]
+        if self._check_crc:
+            (crc,) = _CRC.unpack_from(self._view, offset + length)
+            if masked_crc32c(data) != crc:
+                raise IOError("{} has a corrupted record {}".format(self._path, k))
+        return data
+
+    def __iter__(self) -> Iterator[memoryview]:
+        return self.records()
+
+    def records(self, start: int = 0, stop: Optional[int] = None) -> Iterator[memoryview]:
+        """Iterate over the records in [start, stop).
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        for k in range(start, stop):
+            yield self[k]
+
+    def select(self, indices: Iterable[int]) -> Iterator[memoryview]:
+        """Iterate over the records of the indices, only those are read.
+        """
+        for k in indices:
+            yield self[int(k)]
+
+    def close(self) -> None:
+        try:
+            self._view.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            # views of the records are still alive, e.g. in the traceback of an error, the
+            # mapping is freed with them
+            pass
+        self._file.close()
+
+    def __enter__(self) -> "TFRecordReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def write_tfrecord(path: str, records: Iterable[bytes]) -> None:
+    """Write the records to a TFRecord file readable by tensorflow.
+    """
+    with open(path, "wb") as fout:
+        for data in records:
+            length = _LENGTH.pack(len(data))
+            fout.write(length)
+            fout.write(_CRC.pack(masked_crc32c(length)))
+            fout.write(data)
+            fout.write(_CRC.pack(masked_crc32c(data)))
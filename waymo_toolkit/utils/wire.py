@@ -0,0 +1,153 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# the wire types of protobuf
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+FIXED32 = 5
+
+# the field numbers of Frame, Annotation has the same ones without the sensor data
+CONTEXT_FIELD = 1
+TIMESTAMP_FIELD = 2
+POSE_FIELD = 3
+IMAGES_FIELD = 4
+LASERS_FIELD = 5
+LASER_LABELS_FIELD = 6
+NO_LABEL_ZONES_FIELD = 7
+CAMERA_LABELS_FIELD = 8
+PROJECTED_LIDAR_LABELS_FIELD = 9
+# the fields of Frame kept by Annotation
+LABEL_FIELDS = (
+    CONTEXT_FIELD,
+    TIMESTAMP_FIELD,
+    POSE_FIELD,
+    LASER_LABELS_FIELD,
+    NO_LABEL_ZONES_FIELD,
+    CAMERA_LABELS_FIELD,
+    PROJECTED_LIDAR_LABELS_FIELD,
+)
+
+
+def read_varint(buffer: memoryview, pos: int) -> Tuple[int, int]:
+    """Decode the varint at pos, return it and the position after it.
+    """
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(buffer):
+            raise ValueError("truncated varint")
+        byte = buffer[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def skip_field(buffer: memoryview, pos: int, wire_type: int) -> int:
+    """Return the position after the value of wire_type starting at pos.
+    """
+    if wire_type == VARINT:
+        return read_varint(buffer, pos)[1]
+    if wire_type == FIXED64:
+        return pos + 8
+    if wire_type == LENGTH_DELIMITED:
+        length, pos = read_varint(buffer, pos)
+        return pos + length
+    if wire_type == FIXED32:
+        return pos + 4
+    raise ValueError("unsupported wire type {}".format(wire_type))
+
+
+def iter_fields(record: bytes) -> Iterator[Tuple[int, int, int, int, int]]:
+    """Walk the top-level fields of a serialized message, only reading their tags and
+    lengths. Yield the field number, the wire type, the start of the field, the start of
+    its value (after the length of a length delimited one) and its end.
+    """
+    buffer = memoryview(record).cast("B")
+    pos = 0
+    while pos < len(buffer):
+        start = pos
+        tag, pos = read_varint(buffer, pos)
+        field, wire_type = tag >> 3, tag & 7
+        if wire_type == LENGTH_DELIMITED:
+            length, pos = read_varint(buffer, pos)
+            end = pos + length
+        else:
+            end = skip_field(buffer, pos, wire_type)
+        if end > len(buffer):
+            raise ValueError("truncated field {}".format(field))
+        yield field, wire_type, start, pos, end
+        pos = end
+
+
+def slice_fields(
+    record: bytes, fields: Iterable[int], until: Optional[int] = None
+) -> Dict[int, List[memoryview]]:
+    """Return the values of the requested top-level fields of a serialized message, as
+    views of the record, in their order, the payloads of the length delimited fields and
+    the encoded values of the others. The other fields are skipped by their length.
+    Args:
+        until: stop after the first field with this number, e.g. TIMESTAMP_FIELD only
+            reads the head of a Frame.
+    """
+    buffer = memoryview(record).cast("B")
+    fields = set(fields)
+    sliced = {_: [] for _ in fields}
+    for field, _, _, pos, end in iter_fields(buffer):
+        if field in fields:
+            sliced[field].append(buffer[pos:end])
+        if field == until:
+            break
+    return sliced
+
+
+def slice_runs(record: bytes, fields: Iterable[int]) -> List[memoryview]:
+    """Return views of the runs of consecutive requested top-level fields of a serialized
+    message, with their tags, so each run is a serialized message of its own and merging
+    them all gives the message with only the requested fields.
+    """
+    buffer = memoryview(record).cast("B")
+    fields = set(fields)
+    runs = []
+    run_start = run_end = None
+    for field, _, start, _, end in iter_fields(buffer):
+        if field not in fields:
+            continue
+        if start != run_end:
+            if run_end is not None:
+                runs.append(buffer[run_start:run_end])
+            run_start = start
+        run_end = end
+    if run_end is not None:
+        runs.append(buffer[run_start:run_end])
+    return runs
+
+
+def slice_message(record: bytes, fields: Iterable[int]) -> bytes:
+    """Return a serialized message holding only the requested top-level fields of a
+    serialized message, e.g. a Frame without its images and lasers, only their tags and
+    lengths are read and only the kept fields are copied.
+    """
+    return b"".join(slice_runs(record, fields))
+
+
+def frame_head(record: bytes) -> Tuple[memoryview, int]:
+    """Return the serialized context and the timestamp_micros of a serialized Frame
+    without parsing it. They are written before the sensor data, which is never read.
+    """
+    sliced = slice_fields(record, [CONTEXT_FIELD, TIMESTAMP_FIELD], until=TIMESTAMP_FIELD)
+    if len(sliced[TIMESTAMP_FIELD]) == 0:
+        raise ValueError("the frame has no timestamp")
+    context = sliced[CONTEXT_FIELD][-1] if len(sliced[CONTEXT_FIELD]) > 0 else memoryview(b"")
+    timestamp = read_varint(sliced[TIMESTAMP_FIELD][0], 0)[0]
+    # int64 is encoded as its two's complement
+    if timestamp >= 1 << 63:
+        timestamp -= 1 << 64
+    return context, timestamp
+
+
+def frame_timestamp(record: bytes) -> int:
+    """Read the timestamp_micros of a serialized Frame without parsing it.
+    """
+    return frame_head(record)[1]
@@ -1,2 +1,10 @@
-from .viewer_2d import Viewer2D
-from .viewer_3d import Viewer3D
+# the viewers are imported on first use, so the 2D viewer does not load mayavi
+_VIEWERS = {"Viewer2D": ".viewer_2d", "Viewer3D": ".viewer_3d"}
+
+
+def __getattr__(name):
+    if name in _VIEWERS:
+        import importlib
+
+        return getattr(importlib.import_module(_VIEWERS[name], __name__), name)
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
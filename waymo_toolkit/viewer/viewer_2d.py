@@ -5,9 +5,10 @@ import cv2
 import matplotlib.cm
 import numpy as np
 
-from waymo_toolkit.protos.annotation_pb2 import Annotation
 from waymo_toolkit.utils.box_utils import get_3d_box_projected_corners
-from waymo_toolkit.utils.calibration import get_image_transform
+from waymo_toolkit.utils.label_io import get_vehicle_to_image, load_annotation
+from waymo_toolkit.utils.laser_io import list_laser_frames, load_laser
+from waymo_toolkit.utils.shard import read_record
 
 cmap = matplotlib.cm.get_cmap("jet")
 
@@ -18,12 +19,7 @@ class Viewer2D:
         self._draw_2d = args.box2d
         self._draw_3d = args.box3d
         self._project = args.project
-        self._label_dir = os.path.join(self._base_dir, "label")
-        self._laser_dir = os.path.join(self._base_dir, "laser")
-        self._laser_r_dir = os.path.join(self._base_dir, "laser_r")
-        self._files = [
-            _.replace(".bin", "") for _ in os.listdir(self._laser_dir) if _.endswith("bin")
-        ]
+        self._files = list_laser_frames(self._base_dir, args.split)
         self._current = 0
 
     def _draw_2d_box(
@@ -103,26 +99,31 @@ class Viewer2D:
         for i in range(pcl_cp.shape[0]):
             cv2.circle(img, (int(pcl_cp[i, 0]), int(pcl_cp[i, 1])), 1, coloured_intensity[i])
 
+    def _image_extension(self, filename: str) -> str:
+        """Detect the format the images were extracted with, see --image-format.
+        """
+        for ext in [".jpg", ".png"]:
+            if os.path.isfile(os.path.join(self._base_dir, self._image_dir, filename + ext)):
+                return ext
+        # the shards ignore the extension, and cv2 detects the format of the bytes
+        return ".jpg"
+
     def display(self, camera: int = 0, step: int = 1) -> None:
-        self._image_dir = os.path.join(self._base_dir, "image_{}".format(camera))
+        self._image_dir = "image_{}".format(camera)
         total = len(self._files)
+        image_ext = self._image_extension(self._files[0]) if total > 0 else ".jpg"
 
         while True:
             filename = self._files[self._current % total]
-            image_path = os.path.join(self._image_dir, "{}.jpg".format(filename))
-            label_path = os.path.join(self._label_dir, "{}.pb".format(filename))
-            laser_path = os.path.join(self._laser_dir, "{}.bin".format(filename))
-            laser_r_path = os.path.join(self._laser_r_dir, "{}.bin".format(filename))
-
-            img = cv2.imread(image_path)
-            pcl = np.fromfile(laser_path, dtype=np.float32).reshape(-1, 3)
-            pcl_r = np.fromfile(laser_r_path, dtype=np.float32).reshape(-1, 1)
+            image = read_record(self._base_dir, self._image_dir, filename, image_ext)
 
-            anno = Annotation()
-            anno.ParseFromString(open(label_path, "rb").read())
+            img = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+            laser = load_laser(self._base_dir, filename, ["xyz", "range"])
+            pcl, pcl_r = laser["xyz"], laser["range"]
 
-            camera_calibration = anno.context.camera_calibrations[camera]
-            vehicle_to_image = get_image_transform(camera_calibration)
+            anno = load_annotation(self._base_dir, filename)
+            # the calibrations are resolved once per segment, also for the slim labels
+            vehicle_to_image = get_vehicle_to_image(self._base_dir, anno, camera)
 
             if self._project:
                 self._project_laser_on_image(img, pcl, pcl_r, vehicle_to_image)
@@ -3,19 +3,15 @@ import os
 import numpy as np
 from mayavi import mlab
 
-from waymo_toolkit.protos.annotation_pb2 import Annotation
+from waymo_toolkit.utils.label_io import load_annotation
+from waymo_toolkit.utils.laser_io import list_laser_frames, load_laser
 
 
 class Viewer3D:
     def __init__(self, args):
         self._base_dir = args.source
-        self._label_dir = os.path.join(self._base_dir, "label")
-        self._laser_dir = os.path.join(self._base_dir, "laser")
-        self._laser_r_dir = os.path.join(self._base_dir, "laser_r")
         self._plane_dir = os.path.join(self._base_dir, "plane")
-        self._files = [
-            _.replace(".bin", "") for _ in os.listdir(self._laser_dir) if _.endswith("bin")
-        ]
+        self._files = list_laser_frames(self._base_dir, args.split)
         self._current = 0
         self._reduce = args.reduce
 
@@ -151,12 +147,8 @@ class Viewer3D:
 
         while True:
             filename = self._files[self._current % total]
-            laser_path = os.path.join(self._laser_dir, "{}.bin".format(filename))
-            laser_r_path = os.path.join(self._laser_r_dir, "{}.bin".format(filename))
-            label_path = os.path.join(self._label_dir, "{}.pb".format(filename))
-
-            pcl = np.fromfile(laser_path, dtype=np.float32).reshape(-1, 3)
-            pcl_r = np.fromfile(laser_r_path, dtype=np.float32).reshape(-1, 1)
+            laser = load_laser(self._base_dir, filename, ["xyz", "range"])
+            pcl, pcl_r = laser["xyz"], laser["range"]
 
             if self._reduce:
                 plane_path = os.path.join(self._plane_dir, "{}.txt".format(filename))
@@ -166,8 +158,7 @@ class Viewer3D:
                     pcl = pcl[mask]
                     pcl_r = pcl_r[mask]
 
-            anno = Annotation()
-            anno.ParseFromString(open(label_path, "rb").read())
+            anno = load_annotation(self._base_dir, filename)
 
             labels = anno.laser_labels
 